@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""Асинхронные клиенты iikoServerApi и iikoBiz на asyncio/aiohttp
+
+Методы :class:`AsyncIikoServer` и :class:`AsyncIikoBiz` совпадают с методами
+:class:`~Pyiiko2.server.IikoServer` и :class:`~Pyiiko2.biz.IikoBiz`, но возвращают корутины::
+
+    async with AsyncIikoServer(ip=ip, port=port, login=login, passhash=passhash) as iiko:
+        await iiko.login()
+        olap = await iiko.olap2(json=query)
+        print(olap.json())
+
+Требуется пакет aiohttp (``pip install Pyiiko2[async]``).
+"""
+import asyncio
+import json as jsonlib
+import sys
+import time
+from io import StringIO
+
+import requests
+from defusedxml.ElementTree import parse
+
+from .server import IikoServer, DEFAULT_TIMEOUT
+from .exceptions import IikoError, IikoConnectionError, IikoTimeout, CircuitOpenError
+from .xmlstream import RecordParser, CHUNK_SIZE
+from .biz import IikoBiz
+from .session import ACCEPT_ENCODING, LineSplitter, _retry_after
+from .retry import _discard
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+DEFAULT_POOL_SIZE = 100
+DEFAULT_POOL_PER_HOST = 10
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+DEFAULT_CONCURRENCY = 100
+
+
+def _raw_size(response, content):
+    """Размер тела в байтах, переданных по сети: Content-Length или счетчик aiohttp до распаковки"""
+    if response.content_length is not None:
+        return response.content_length
+    return getattr(response.content, 'total_raw_bytes', len(content))
+
+
+def _raise_for_status(response):
+    """Общая для асинхронных ответов проверка кода: то же исключение, что у синхронного клиента"""
+    if not response.ok:
+        raise requests.HTTPError('%s Error for url: %s' % (response.status_code, response.url), response=response)
+
+
+class AsyncResponse(object):
+    """Прочитанный ответ асинхронного клиента
+
+    Повторяет основные атрибуты requests.Response: status_code, headers, url, content, text, json().
+
+    :attr raw_size: размер тела в байтах, переданных по сети (до распаковки), как в метриках \
+    синхронного клиента.
+    """
+
+    def __init__(self, status_code, headers, url, content, encoding=None, raw_size=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.raw_size = len(content) if raw_size is None else raw_size
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self, **kwargs):
+        return jsonlib.loads(self.text, **kwargs)
+
+    def raise_for_status(self):
+        """Выбрасывает requests.HTTPError для ответов 4xx и 5xx, как requests.Response"""
+        _raise_for_status(self)
+
+    def __repr__(self):
+        return '<AsyncResponse [%s]>' % self.status_code
+
+
+class AsyncStreamResponse(object):
+    """Ответ асинхронного клиента, тело которого читается по мере поступления
+
+    Соединение возвращается в пул после полного чтения :meth:`iter_content` или вызова :meth:`close`.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.content_length = response.content_length
+        self.raw_size = response.content_length or 0
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    async def iter_content(self, chunk_size=64 * 1024):
+        try:
+            async for chunk in self._response.content.iter_chunked(chunk_size):
+                yield chunk
+        finally:
+            self.close()
+
+    async def iter_lines(self, chunk_size=64 * 1024, decode_unicode=False, delimiter=None):
+        """Асинхронный генератор строк тела по мере загрузки
+
+        См. :func:`Pyiiko2.session.iter_lines`.
+        """
+        splitter = LineSplitter(delimiter)
+        encoding = self._response.charset or 'utf-8'
+        async for chunk in self.iter_content(chunk_size):
+            for line in splitter.feed(chunk):
+                yield line.decode(encoding) if decode_unicode else line
+        for line in splitter.close():
+            yield line.decode(encoding) if decode_unicode else line
+
+    def raise_for_status(self):
+        """Выбрасывает requests.HTTPError для ответов 4xx и 5xx, как requests.Response"""
+        _raise_for_status(self)
+
+    def close(self):
+        self._response.release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return '<AsyncStreamResponse [%s]>' % self.status_code
+
+
+def _encode_params(params):
+    """Приводит параметры запроса к виду, который принимает aiohttp
+
+    Как и в requests, списки разворачиваются в повторяющиеся параметры, а None пропускается.
+    """
+    if not params:
+        return None
+    if isinstance(params, dict):
+        params = params.items()
+    encoded = []
+    for key, value in params:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is not None:
+                encoded.append((str(key), str(item)))
+    return encoded
+
+
+class AsyncBaseClient(object):
+    """Общая часть асинхронных клиентов: пул соединений, лимит одновременных запросов и таймауты
+
+    :param session: (optional) готовая aiohttp.ClientSession, например общая для многих ресторанов.
+    :param pool_size: максимальное количество соединений в пуле.
+    :param pool_per_host: максимальное количество соединений к одному хосту.
+    :param keepalive_timeout: сколько секунд держать простаивающее соединение открытым.
+    :param concurrency: максимальное количество одновременно выполняемых запросов клиента.
+    :param limiter: (optional) :class:`~Pyiiko2.limiter.AdaptiveLimiter` для адаптивного ограничения нагрузки.
+    :param retry: (optional) :class:`~Pyiiko2.retry.RetryPolicy` для повтора GET-запросов.
+    :param breaker: (optional) :class:`~Pyiiko2.retry.CircuitBreaker`.
+    :param metrics: (optional) :class:`~Pyiiko2.metrics.Metrics`.
+    """
+
+    def _init_session(self, session=None, pool_size=DEFAULT_POOL_SIZE, pool_per_host=DEFAULT_POOL_PER_HOST,
+                      keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, limiter=None,
+                      retry=None, breaker=None, metrics=None):
+        if aiohttp is None:
+            raise ImportError('Для асинхронного клиента требуется пакет aiohttp')
+        self._own_session = session is None
+        self._session = session
+        self._pool_size = pool_size
+        self._pool_per_host = pool_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = limiter
+        self._retry = retry
+        self._breaker = breaker
+        self._metrics = metrics
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, limit_per_host=self._pool_per_host,
+                                             keepalive_timeout=self._keepalive_timeout)
+            # сжатые ответы распаковываются aiohttp, в том числе при потоковом чтении
+            self._session = aiohttp.ClientSession(connector=connector, auto_decompress=True,
+                                                  headers={'Accept-Encoding': ACCEPT_ENCODING})
+            self._own_session = True
+        return self._session
+
+    async def _request(self, method, url, **kwargs):
+        metrics = self._metrics
+        endpoint = self._endpoint(url) if metrics is not None else None
+        attempt = 0
+        while True:
+            if self._breaker is not None and not self._breaker.allow():
+                raise CircuitOpenError('Сервер не отвечает, запрос не отправлялся: ' + self.address)
+            if metrics is not None:
+                metrics.request_started(endpoint, method, attempt)
+                started = time.monotonic()
+            response = error = None
+            try:
+                response = await self._send(method, url, **kwargs)
+            except asyncio.TimeoutError as e:
+                error = IikoTimeout(e)
+            except aiohttp.ClientError as e:
+                error = IikoConnectionError(e)
+            finally:
+                # выполняется и при отмене задачи: пробный запрос размыкателя не зависает
+                failed = response is None
+                if metrics is not None:
+                    if failed:
+                        metrics.request_finished(endpoint, method, attempt, None, time.monotonic() - started, 0,
+                                                 error or sys.exc_info()[1])
+                    else:
+                        metrics.request_finished(endpoint, method, attempt, response.status_code,
+                                                 time.monotonic() - started, response.raw_size)
+                if self._breaker is not None:
+                    self._breaker.record(failed or response.status_code >= 500)
+            retry = self._retry
+            if (retry is not None and retry.can_retry(method, attempt)
+                    and (error is not None or response.status_code in retry.statuses)):
+                delay = retry.delay(attempt)
+                if error is None:
+                    delay = max(delay, _retry_after(response))
+                    if isinstance(response, AsyncStreamResponse):
+                        response.close()
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if error is not None:
+                raise error
+            return response
+
+    async def _hedged(self, method, url, **kwargs):
+        """Дублирует запрос, если ответа нет через hedge_delay секунд; возвращает первый успешный
+
+        Ответ проигравшей попытки закрывается, а сама она отменяется.
+        """
+        started = [asyncio.ensure_future(self._request(method, url, **kwargs))]
+        done, _ = await asyncio.wait(started, timeout=self._hedge_delay)
+        if not done:
+            started.append(asyncio.ensure_future(self._request(method, url, **kwargs)))
+        winner = None
+        error = None
+        try:
+            tasks = set(started)
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in started:
+                if task is not winner:
+                    task.add_done_callback(_discard)
+                    task.cancel()
+
+    async def _send(self, method, url, params=None, data=None, json=None, headers=None, timeout=None,
+                    stream=False):
+        timeout = self.timeout if timeout is None else timeout
+        # Для потокового чтения ограничивается ожидание каждого куска, а не весь ответ
+        timeout = aiohttp.ClientTimeout(sock_read=timeout) if stream else aiohttp.ClientTimeout(total=timeout)
+        async with self._semaphore:
+            if self._limiter is None:
+                response = await self.session.request(method, url, params=_encode_params(params), data=data,
+                                                      json=json, headers=headers, timeout=timeout)
+            else:
+                async with await self._limiter.async_acquire() as slot:
+                    response = await self.session.request(method, url, params=_encode_params(params), data=data,
+                                                          json=json, headers=headers, timeout=timeout)
+                    slot.record(response.status)
+            if stream:
+                return AsyncStreamResponse(response)
+            try:
+                content = await response.read()
+                return AsyncResponse(response.status, response.headers, str(response.url), content,
+                                     response.get_encoding() if content else None, _raw_size(response, content))
+            finally:
+                response.release()
+
+    async def close(self):
+        """Закрывает пул соединений клиента
+
+        Переданная снаружи сессия не закрывается.
+        """
+        if self._session is not None and self._own_session:
+            await self._session.close()
+        self._session = None
+
+    def __del__(self):
+        # Асинхронно разлогиниться из деструктора нельзя, используйте close() или async with
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncIikoServer(AsyncBaseClient, IikoServer):
+    """Асинхронный клиент iikoSeverApi
+
+    Принимает те же параметры, что и :class:`~Pyiiko2.server.IikoServer`, а также параметры пула
+    :class:`AsyncBaseClient`. Токен освобождается в :meth:`close`.
+    """
+
+    def __init__(self, ip=None, port=None, login=None, passhash=None, token=None, timeout=DEFAULT_TIMEOUT,
+                 session=None, pool_size=DEFAULT_POOL_SIZE, pool_per_host=DEFAULT_POOL_PER_HOST,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, limiter=None,
+                 retry=None, breaker=None, metrics=None):
+        self.address = 'http://' + ip + ':' + (str(port) or '80') + '/resto/'
+        self._login = login
+        self._passhash = passhash
+        self._token = token
+        self.set_timeout(timeout)
+        self._init_session(session, pool_size, pool_per_host, keepalive_timeout, concurrency, limiter, retry,
+                           breaker, metrics)
+
+    async def close(self):
+        """Уничтожает токен и закрывает пул соединений"""
+        if self._token is not None and self._session is not None:
+            try:
+                await self.logout()
+            except IikoError:
+                self._token = None
+        await super().close()
+
+    async def login(self):
+        """Метод получает новый токен
+
+        См. :meth:`Pyiiko2.server.IikoServer.login`.
+
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        if self._token is not None:
+            await self.logout()
+
+        url = self.address + 'api/auth?login=' + self._login + "&pass=" + self._passhash
+        login = await self._request('GET', url)
+        if login.status_code == 200:
+            self._token = login.text
+        return login
+
+    async def logout(self):
+        """
+        Уничтожение токена
+
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        logout = await self._request('GET', self.address + 'api/logout?key=' + self.token)
+        self._token = None
+        return logout
+
+    async def version(self):
+        """Позволяет узнать версию iiko
+
+        :returns: Версия iiko в формате string
+        :raises IikoConnectionError: сервер недоступен.
+        """
+        info = await self.server_info()
+        return parse(StringIO(info.text)).findtext('.//version')
+
+    async def server_info(self):
+        """Вовращает информацию о сервере и статусе лицензии
+
+        :returns: AsyncResponse
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        return await self._request('GET', self.address + 'get_server_info.jsp?encoding=UTF-8')
+
+    async def get(self, path, params=None, stream=False):
+        """
+        Возвращает ответ по заданному пути с использованием токена авторизации
+
+        :param stream: вернуть :class:`AsyncStreamResponse` вместо прочитанного ответа.
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + path + "?key=" + self.token
+        return await self._request('GET', url, params=params, stream=stream)
+
+    async def post(self, path, data=None, json=None, headers=None):
+        """
+        Возвращает ответ по заданному пути с использованием токена авторизации
+
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + path + "?key=" + self.token
+        return await self._request('POST', url, data=data, json=json, headers=headers)
+
+    async def iter_records(self, path, tag, params=None, chunk_size=CHUNK_SIZE):
+        """Асинхронный генератор элементов-записей XML-ответа, разбираемого по мере загрузки
+
+        См. :meth:`Pyiiko2.server.IikoServer.iter_records`.
+        """
+        url = self.address + path + "?key=" + self.token
+        response = await self._request('GET', url, params=params, stream=True)
+        try:
+            response.raise_for_status()
+            parser = RecordParser(tag)
+            async for chunk in response.iter_content(chunk_size):
+                for element in parser.feed(chunk):
+                    yield element
+            for element in parser.close():
+                yield element
+        finally:
+            response.close()
+
+    async def edi(self, edi, **kwargs):
+        """Список заказов для участника EDI senderId и поставщика seller
+
+        См. :meth:`Pyiiko2.server.IikoServer.edi`.
+        """
+        url = self.address + 'edi/' + edi + '/orders/bySeller'
+        return await self._request('GET', url, params=kwargs)
+
+
+class AsyncIikoBiz(AsyncBaseClient, IikoBiz):
+    """Асинхронный клиент iikoBiz
+
+    Принимает те же параметры, что и :class:`~Pyiiko2.biz.IikoBiz`, а также параметры пула
+    :class:`AsyncBaseClient`.
+    """
+
+    def __init__(self, ip=None, port=None, login=None, password=None, token=None, timeout=DEFAULT_TIMEOUT,
+                 session=None, pool_size=DEFAULT_POOL_SIZE, pool_per_host=DEFAULT_POOL_PER_HOST,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, limiter=None,
+                 retry=None, breaker=None, hedge_delay=None, metrics=None):
+        self._ip = ip
+        self._port = port
+        self._login = login
+        self._password = password
+        self._token = token
+        self._hedge_delay = hedge_delay
+        self.set_timeout(timeout)
+        self._init_session(session, pool_size, pool_per_host, keepalive_timeout, concurrency, limiter, retry,
+                           breaker, metrics)
+
+    async def login(self):
+        """Получает токен доступа
+
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + 'api/0/auth/access_token?user_id=' + self._login + '&user_secret=' + self._password
+        login = await self._request('GET', url)
+        if login.status_code == 200 and len(login.text) > 2:
+            self._token = login.text[1:-1]
+        return login
+
+    async def get(self, path, params=None, stream=False, hedge=False):
+        """
+        Возвращает ответ по заданному пути с использованием токена авторизации
+
+        :param stream: вернуть :class:`AsyncStreamResponse` вместо прочитанного ответа.
+        :param hedge: продублировать запрос, если ответа нет через hedge_delay секунд.
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + path + "?access_token=" + self.token
+        if hedge and self._hedge_delay is not None:
+            return await self._hedged('GET', url, params=params, stream=stream)
+        return await self._request('GET', url, params=params, stream=stream)
+
+    async def post(self, path, data=None, json=None, headers=None):
+        """
+        Возвращает ответ по заданному пути с использованием токена авторизации
+
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + path + "?access_token=" + self.token
+        return await self._request('POST', url, data=data, json=json, headers=headers)
@@ -1,18 +1,30 @@
 # -*- coding: utf-8 -*-
-import requests
-from io import StringIO
+from .session import BaseClient, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE
+from .retry import hedged
 
 DEFAULT_TIMEOUT = 4
 
-class IikoBiz:
+class IikoBiz(BaseClient):
+    """Класс отвечающий за работу с iikoBiz
 
-    def __init__(self, ip=None, port=None, login=None, password=None, token=None, timeout=DEFAULT_TIMEOUT):
+    :param retry: (optional) :class:`~Pyiiko2.retry.RetryPolicy` для повтора GET-запросов.
+    :param breaker: (optional) :class:`~Pyiiko2.retry.CircuitBreaker`.
+    :param metrics: (optional) :class:`~Pyiiko2.metrics.Metrics` для учета запросов по методам API.
+    :param hedge_delay: (optional) через сколько секунд без ответа продублировать запрос \
+    stop_list и get_order; первый полученный ответ возвращается.
+    """
+
+    def __init__(self, ip=None, port=None, login=None, password=None, token=None, timeout=DEFAULT_TIMEOUT,
+                 session=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, limiter=None, retry=None, breaker=None, hedge_delay=None, metrics=None):
         self._ip = ip
         self._port = port
         self._login = login
         self._password = password
         self._token = token
+        self._hedge_delay = hedge_delay
         self.set_timeout(timeout)
+        self._init_session(session, pool_connections, pool_maxsize, pool_block, limiter, retry, breaker, metrics)
 
     @property
     def address(self):
@@ -34,37 +46,40 @@ class IikoBiz:
         return str(self._token)
 
     def login(self):
-        try:
-            url = self.address + 'api/0/auth/access_token?user_id=' + self._login + '&user_secret=' + self._password 
-            login = requests.get(url, timeout=self.timeout)
-            if login.status_code == 200 and len(login.text)>2:
-                self._token = login.text[1:-1]
-            return login
+        """Получает токен доступа
 
-        except requests.exceptions.ConnectTimeout:
-            print("Не удалось получить токен " + "\n" + self.login)
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        url = self.address + 'api/0/auth/access_token?user_id=' + self._login + '&user_secret=' + self._password
+        login = self._request('GET', url)
+        if login.status_code == 200 and len(login.text)>2:
+            self._token = login.text[1:-1]
+        return login
 
-    def get(self, path, params=None):
+    def get(self, path, params=None, stream=False, hedge=False):
         """
         Возвращает request по заданному пути с использованием токена авторизации
+
+        :param stream: не читать тело ответа сразу, а отдавать его через iter_content.
+        :param hedge: продублировать запрос, если ответа нет через hedge_delay секунд.
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
         """
-        try:
-            url = self.address + path + "?access_token=" + self.token
-            return requests.get(url=url, params=params, timeout=self.timeout)
-        except Exception as e:
-            print(path)
-            print(e)
+        url = self.address + path + "?access_token=" + self.token
+        if hedge and self._hedge_delay is not None:
+            return hedged(lambda: self._request('GET', url, params=params, stream=stream), self._hedge_delay)
+        return self._request('GET', url, params=params, stream=stream)
 
     def post(self, path, data=None, json=None, headers=None):
         """
         Возвращает request по заданному пути с использованием токена авторизации
+
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
         """
-        try:
-            url = self.address + path + "?access_token=" + self.token
-            return requests.post(url=url, data=data, json=json, headers=headers, timeout=self.timeout)
-        except Exception as e:
-            print(path)
-            print(e)
+        url = self.address + path + "?access_token=" + self.token
+        return self._request('POST', url, data=data, json=json, headers=headers)
 
 
     def organization(self, **kwargs):
@@ -77,7 +92,7 @@ class IikoBiz:
         return self.get("api/0/orders/get_courier_orders", params=kwargs)
 
     def get_order(self, **kwargs):
-        return self.get("api/0/orders/info", params=kwargs)
+        return self.get("api/0/orders/info", params=kwargs, hedge=True)
 
     def delivery_orders(self, **kwargs):
         return self.get("api/0/orders/deliveryOrders", params=kwargs)
@@ -98,7 +113,7 @@ class IikoBiz:
         return self.get("api/0/citiesList/streets", params=kwargs)
 
     def stop_list(self, **kwargs):
-        return self.get("api/0/stopLists/getDeliveryStopList", params=kwargs)
+        return self.get("api/0/stopLists/getDeliveryStopList", params=kwargs, hedge=True)
 
     def events(self, **kwargs):
         return self.get("api/0/events/events", params=kwargs)
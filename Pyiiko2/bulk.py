@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Пакетная загрузка документов (акты приготовления и другие импорты XML)
+
+:class:`BulkImporter` отправляет документы параллельно через пул соединений клиента, держа в
+работе не больше max_in_flight запросов. Ответ каждого запроса (documentValidationResult)
+сопоставляется с исходным документом, документ с ошибкой связи повторяется отдельно, а итог
+записывается в журнал — повторный запуск пропускает уже загруженные документы::
+
+    importer = BulkImporter(iiko, journal='/var/lib/pyiiko/production-2020-01.jsonl', max_in_flight=8)
+    for result in importer.run(documents):
+        if not result.ok:
+            print(result.key, result.error)
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from io import StringIO
+
+from defusedxml.ElementTree import parse
+
+from .exceptions import IikoError
+from .retry import RetryPolicy
+from .session import _retry_after
+
+DEFAULT_IN_FLIGHT = 4
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = RetryPolicy(retries=DEFAULT_RETRIES, backoff=1.0)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_NUMBER = re.compile(r'<documentNumber>\s*([^<]*?)\s*</documentNumber>')
+
+
+class ImportResult(namedtuple('ImportResult', 'key number ok validation error attempts elapsed')):
+    """Итог загрузки одного документа
+
+    :attr key: ключ документа в журнале.
+    :attr number: номер документа (documentNumber) или None.
+    :attr validation: разобранный documentValidationResult или None.
+    :attr error: текст ошибки или None.
+    :attr attempts: количество отправок.
+    """
+
+    __slots__ = ()
+
+
+def document_number(xml):
+    """Номер документа (documentNumber) из XML или None"""
+    text = xml.decode('utf-8') if isinstance(xml, bytes) else xml
+    match = _NUMBER.search(text)
+    return match.group(1) if match and match.group(1) else None
+
+
+def document_key(xml):
+    """Ключ документа: documentNumber, а если его нет — хэш содержимого"""
+    number = document_number(xml)
+    if number is not None:
+        return number
+    return hashlib.sha1(xml if isinstance(xml, bytes) else xml.encode('utf-8')).hexdigest()
+
+
+def parse_validation(text):
+    """Разбирает ответ documentValidationResult
+
+    :returns: словарь с ключами valid, warning (bool), documentNumber, otherSuggestedNumber, errorMessage, \
+    additionalInfo.
+    """
+    root = parse(StringIO(text)).getroot()
+    result = {child.tag: child.text for child in root}
+    for field in ('valid', 'warning'):
+        result[field] = result.get(field) == 'true'
+    return result
+
+
+class ImportJournal(object):
+    """Журнал загрузки в формате JSON Lines
+
+    :param path: путь к файлу журнала; дописывается, а не перезаписывается.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # строка, оборванная остановкой процесса
+                    if entry['ok']:
+                        self.done.add(entry['key'])
+                        self.failed.pop(entry['key'], None)
+                    else:
+                        self.failed[entry['key']] = entry['error']
+        self._file = open(path, 'a')
+
+    def record(self, result):
+        self._file.write(json.dumps({'key': result.key, 'number': result.number, 'ok': result.ok,
+                                     'error': result.error, 'attempts': result.attempts, 'time': time.time()},
+                                    ensure_ascii=False) + '\n')
+        self._file.flush()
+        if result.ok:
+            self.done.add(result.key)
+            self.failed.pop(result.key, None)
+        else:
+            self.failed[result.key] = result.error
+
+    def close(self):
+        self._file.close()
+
+
+class BulkImporter(object):
+    """Параллельная загрузка XML-документов одним методом клиента
+
+    :param server: IikoServer.
+    :param method: имя метода импорта, принимающего XML документа.
+    :param journal: (optional) путь к журналу или :class:`ImportJournal`.
+    :param max_in_flight: максимальное количество одновременно отправленных документов; не больше \
+    pool_maxsize клиента.
+    :param retries: сколько раз повторять документ при ошибке связи или ответе 429/5xx. Документы, \
+    отклоненные проверкой сервера (valid=false), не повторяются.
+    :param backoff: :class:`~Pyiiko2.retry.RetryPolicy` с паузой перед повтором, как в \
+    :func:`~Pyiiko2.olap.olap2_sharded`; Retry-After сервера продлевает паузу. Число задает базовую \
+    паузу в секундах, удваиваемую с каждой попыткой без случайного разброса.
+    """
+
+    def __init__(self, server, method='production_doc', journal=None, max_in_flight=DEFAULT_IN_FLIGHT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.server = server
+        self.method = method
+        self.journal = ImportJournal(journal) if isinstance(journal, str) else journal
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff if isinstance(backoff, RetryPolicy) else RetryPolicy(backoff=backoff, jitter=False)
+
+    def _keyed(self, documents):
+        for document in documents:
+            if isinstance(document, tuple):
+                yield document
+            else:
+                yield document_key(document), document
+
+    def run(self, documents):
+        """Загружает документы
+
+        :param documents: итерируемые XML документов (str или bytes) или пары (ключ, XML). Читаются \
+        по мере отправки, поэтому могут быть генератором.
+        :returns: генератор :class:`ImportResult` в порядке завершения; уже загруженные по журналу \
+        документы пропускаются.
+        """
+        done = self.journal.done if self.journal is not None else set()
+        documents = ((key, xml) for key, xml in self._keyed(documents) if key not in done)
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while True:
+                for key, xml in documents:
+                    running.add(executor.submit(self._upload, key, xml))
+                    if len(running) >= self.max_in_flight:
+                        break
+                if not running:
+                    return
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if self.journal is not None:
+                        self.journal.record(result)
+                    yield result
+
+    def _upload(self, key, xml):
+        started = time.monotonic()
+        number = document_number(xml)
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = 0
+            try:
+                response = getattr(self.server, self.method)(xml)
+            except IikoError as e:
+                error = str(e)
+            else:
+                if response.status_code in RETRY_STATUSES:
+                    error = '%s %s' % (response.status_code, response.text[:200])
+                    retry_after = _retry_after(response)
+                elif response.status_code != 200:
+                    return self._result(key, number, None, '%s %s' % (response.status_code, response.text[:200]),
+                                        attempt, started)
+                else:
+                    return self._validated(key, number, response.text, attempt, started)
+            if attempt > self.retries:
+                return self._result(key, number, None, error, attempt, started)
+            time.sleep(max(self.backoff.delay(attempt - 1), retry_after))
+
+    def _validated(self, key, number, text, attempt, started):
+        try:
+            validation = parse_validation(text)
+        except Exception as e:
+            return self._result(key, number, None, 'Некорректный ответ сервера: %s' % e, attempt, started)
+        returned = validation.get('documentNumber')
+        if number is not None and returned and returned != number:
+            error = 'Ответ относится к документу %s' % returned
+        elif not validation['valid']:
+            error = validation.get('errorMessage') or validation.get('additionalInfo') or 'Документ не принят'
+        else:
+            error = None
+        return self._result(key, returned or number, validation, error, attempt, started)
+
+    def _result(self, key, number, validation, error, attempt, started):
+        return ImportResult(key, number, error is None, validation, error, attempt, time.monotonic() - started)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def import_documents(server, documents, method='production_doc', **kwargs):
+    """Загружает документы и возвращает сводку
+
+    Параметры kwargs передаются в :class:`BulkImporter`.
+
+    :returns: словарь ``{'ok': n, 'failed': {ключ: ошибка}}``.
+    """
+    summary = {'ok': 0, 'failed': {}}
+    with BulkImporter(server, method, **kwargs) as importer:
+        for result in importer.run(documents):
+            if result.ok:
+                summary['ok'] += 1
+            else:
+                summary['failed'][result.key] = result.error
+    return summary
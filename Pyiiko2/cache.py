@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Кэш ответов редко меняющихся справочников iikoServerApi
+
+Подразделения, склады, группы, терминалы, сотрудники, поставщики и дерево событий меняются
+редко, а запрашиваются в начале почти каждой задачи. Клиент с кэшем отдает их из памяти или с
+диска, пока не истек срок хранения (TTL) справочника::
+
+    cache = ResponseCache(DiskBackend('/var/cache/pyiiko/reference.sqlite'), ttl={'api/suppliers': 600})
+    iiko = IikoServer(ip=ip, port=port, login=login, passhash=passhash, cache=cache)
+    iiko.stores()   # запрос к серверу
+    iiko.stores()   # из кэша
+
+После истечения срока запрос отправляется с If-None-Match/If-Modified-Since, если сервер прислал
+ETag или Last-Modified, и ответ 304 продлевает сохраненную копию. Одновременные одинаковые
+запросы, не нашедшие ответа в кэше, объединяются в один запрос к серверу.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_TTL = {
+    'api/corporation/departments': 3600,
+    'api/corporation/stores': 3600,
+    'api/corporation/groups': 3600,
+    'api/corporation/terminals': 3600,
+    'api/corporation/employees': 900,
+    'api/suppliers': 900,
+    'api/events/metadata': 24 * 3600,
+}
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def _entry_size(entry):
+    return len(entry['content'])
+
+
+class MemoryBackend(object):
+    """Хранилище ответов в памяти процесса с вытеснением давно не использованных (LRU)
+
+    :param max_entries: максимальное количество ответов.
+    :param max_bytes: максимальный суммарный размер тел ответов.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= _entry_size(previous)
+            self._entries[key] = entry
+            self._bytes += _entry_size(entry)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _entry_size(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= _entry_size(entry)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._bytes -= _entry_size(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        return self._bytes
+
+
+class DiskBackend(object):
+    """Хранилище ответов в SQLite, общее для процессов и переживающее перезапуск
+
+    :param path: путь к файлу SQLite.
+    :param max_bytes: максимальный суммарный размер тел ответов; при превышении вытесняются \
+    ответы, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS response ('
+                         'key TEXT PRIMARY KEY, meta TEXT, content BLOB, size INTEGER, accessed REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT meta, content FROM response WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE response SET accessed = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+        entry = json.loads(row[0])
+        entry['content'] = bytes(row[1])
+        return entry
+
+    def set(self, key, entry):
+        meta = dict(entry)
+        content = meta.pop('content')
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?)',
+                             (key, json.dumps(meta), content, len(content), time.time()))
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM response').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute('SELECT key, size FROM response ORDER BY accessed').fetchall():
+            self._db.execute('DELETE FROM response WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM response WHERE key = ?', (key,))
+            self._db.commit()
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            self._db.execute('DELETE FROM response WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM response')
+            self._db.commit()
+
+    def size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM response').fetchone()[0]
+
+
+def _to_entry(response, ttl):
+    return {
+        'status': response.status_code,
+        'url': response.url,
+        'encoding': response.encoding,
+        'headers': {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers},
+        'content': response.content,
+        'expires': time.time() + ttl,
+    }
+
+
+def _to_response(entry):
+    """Новый requests.Response из сохраненной копии: вызывающий код может менять его как угодно"""
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.url = entry['url']
+    response.encoding = entry['encoding']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response._content = entry['content']
+    return response
+
+
+class _Pending(object):
+    __slots__ = ('done', 'entry', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class ResponseCache(object):
+    """Кэш GET-ответов справочников для :class:`~Pyiiko2.server.IikoServer`
+
+    Кэшируются только пути, для которых задан срок хранения; остальные запросы проходят мимо кэша.
+
+    :param backend: (optional) :class:`MemoryBackend` (по умолчанию) или :class:`DiskBackend`.
+    :param ttl: (optional) сроки хранения в секундах по путям API, дополняют и переопределяют \
+    :data:`DEFAULT_TTL`; None вместо числа отключает кэш для пути.
+    """
+
+    def __init__(self, backend=None, ttl=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def client_prefix(self, client):
+        """Начало ключей всех ответов клиента (адрес сервера и логин)"""
+        normalized = json.dumps([client.address, client._login], ensure_ascii=False)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16] + ':'
+
+    def key(self, client, path, params=None):
+        items = sorted((str(name), value if isinstance(value, (list, tuple)) else [value])
+                       for name, value in (params or {}).items() if value is not None)
+        normalized = json.dumps([client.address, client._login, path.strip('/'), items], default=str,
+                                ensure_ascii=False)
+        return self.client_prefix(client) + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, client, path, params=None):
+        """Ответ на GET path из кэша или с сервера
+
+        :returns: requests.Response
+        """
+        ttl = self.ttl.get(path.strip('/'))
+        if ttl is None:
+            return client._call('GET', path, params=params)
+        key = self.key(client, path, params)
+        entry = self.backend.get(key)
+        if entry is not None and entry['expires'] > time.time():
+            return _to_response(entry)
+
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return _to_response(pending.entry)
+
+        try:
+            pending.entry = self._fetch(client, path, params, key, entry, ttl)
+            return _to_response(pending.entry)
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def _fetch(self, client, path, params, key, entry, ttl):
+        headers = {}
+        if entry is not None:
+            if 'ETag' in entry['headers']:
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if 'Last-Modified' in entry['headers']:
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        response = client._call('GET', path, params=params, headers=headers or None)
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry, expires=time.time() + ttl)
+            self.backend.set(key, entry)
+            return entry
+        fresh = _to_entry(response, ttl)
+        if response.status_code == 200:
+            self.backend.set(key, fresh)
+        return fresh
+
+    def invalidate(self, client=None, path=None, params=None):
+        """Удаляет сохраненный ответ
+
+        Без аргументов очищает весь кэш, с одним client — все ответы этого сервера и логина.
+        """
+        if client is None:
+            self.backend.clear()
+        elif path is None:
+            self.backend.delete_prefix(self.client_prefix(client))
+        else:
+            self.backend.delete(self.key(client, path, params))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Локальное хранилище технологических карт
+
+Первая синхронизация загружает карты через ``assemblyCharts_getAll``, следующие — только
+изменения через ``assemblyCharts_getAllUpdate`` начиная с сохраненной ревизии (knownRevision).
+Карты хранятся в SQLite вместе с индексами продукт -> карты и карта -> ингредиенты::
+
+    store = AssemblyChartStore(iiko, '/var/lib/pyiiko/charts.sqlite', date_from='2020-01-01')
+    store.sync()
+    store.charts_for_product(product_id)
+    store.ingredients(chart_id)
+    store.charts_using(ingredient_id)
+"""
+import json
+import sqlite3
+import threading
+
+KINDS = {
+    'assembly': ('assemblyCharts', 'deletedAssemblyChartIds'),
+    'prepared': ('preparedCharts', 'deletedPreparedChartIds'),
+}
+
+
+class AssemblyChartStore(object):
+    """Технологические карты одного сервера
+
+    :param server: IikoServer.
+    :param path: путь к файлу SQLite; ``:memory:`` — хранилище только в памяти.
+    :param date_from: (YYYY-MM-DD) дата, начиная с которой загружаются карты.
+    :param include_prepared: загружать карты заготовок.
+    """
+
+    def __init__(self, server, path, date_from, include_prepared=True):
+        self.server = server
+        self.date_from = date_from
+        self.include_prepared = include_prepared
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS chart (
+                kind TEXT, id TEXT PRIMARY KEY, product TEXT, date_from TEXT, date_to TEXT, data TEXT);
+            CREATE INDEX IF NOT EXISTS chart_product ON chart (product);
+            CREATE TABLE IF NOT EXISTS ingredient (chart TEXT, product TEXT, position INTEGER, data TEXT);
+            CREATE INDEX IF NOT EXISTS ingredient_chart ON ingredient (chart);
+            CREATE INDEX IF NOT EXISTS ingredient_product ON ingredient (product);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    @property
+    def revision(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else None
+
+    def _params(self):
+        return {'dateFrom': self.date_from, 'includePreparedCharts': str(self.include_prepared).lower()}
+
+    def sync(self, full=False):
+        """Загружает изменения карт с сохраненной ревизии
+
+        :param full: загрузить все карты заново.
+        :returns: словарь ``{'updated': n, 'deleted': n, 'revision': n}``; revision — None, если сервер \
+        ее не вернул (тогда следующая синхронизация будет полной).
+        """
+        revision = None if full else self.revision
+        if revision is None:
+            response = self.server.assemblyCharts_getAll(**self._params())
+        else:
+            response = self.server.assemblyCharts_getAllUpdate(knownRevision=revision, **self._params())
+        response.raise_for_status()
+        result = response.json()
+        with self._lock:
+            if revision is None:
+                self._db.execute('DELETE FROM chart')
+                self._db.execute('DELETE FROM ingredient')
+            stats = self._apply(result)
+            stats['revision'] = result.get('knownRevision')
+            if stats['revision'] is None:
+                # без ревизии следующая синхронизация загружает все карты заново
+                self._db.execute("DELETE FROM meta WHERE key = 'revision'")
+            else:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('revision', ?)", (str(stats['revision']),))
+            self._db.commit()
+        return stats
+
+    def _apply(self, result):
+        updated = deleted = 0
+        for kind, (charts_key, deleted_key) in KINDS.items():
+            removed = list(result.get(deleted_key) or [])
+            charts = result.get(charts_key) or []
+            ids = removed + [chart['id'] for chart in charts]
+            self._db.executemany('DELETE FROM chart WHERE id = ?', [(id,) for id in ids])
+            self._db.executemany('DELETE FROM ingredient WHERE chart = ?', [(id,) for id in ids])
+            self._db.executemany('INSERT INTO chart VALUES (?, ?, ?, ?, ?, ?)', [
+                (kind, chart['id'], chart.get('assembledProductId'), chart.get('dateFrom'), chart.get('dateTo'),
+                 json.dumps(chart, ensure_ascii=False)) for chart in charts])
+            self._db.executemany('INSERT INTO ingredient VALUES (?, ?, ?, ?)', [
+                (chart['id'], item.get('productId'), position, json.dumps(item, ensure_ascii=False))
+                for chart in charts for position, item in enumerate(chart.get('items') or [])])
+            updated += len(charts)
+            deleted += len(removed)
+        return {'updated': updated, 'deleted': deleted}
+
+    def chart(self, id):
+        row = self._db.execute('SELECT data FROM chart WHERE id = ?', (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def charts_for_product(self, product_id, date=None, kind=None):
+        """Карты, по которым готовится продукт
+
+        :param date: (optional) (YYYY-MM-DD) только карты, действующие на дату.
+        :param kind: (optional) ``assembly`` или ``prepared``.
+        """
+        where, args = 'product = ?', [product_id]
+        if kind is not None:
+            where += ' AND kind = ?'
+            args.append(kind)
+        if date is not None:
+            where += ' AND substr(date_from, 1, 10) <= ? AND (date_to IS NULL OR substr(date_to, 1, 10) > ?)'
+            args += [date, date]
+        return [json.loads(data) for data, in
+                self._db.execute('SELECT data FROM chart WHERE ' + where + ' ORDER BY date_from', args)]
+
+    def ingredients(self, chart_id):
+        """Строки (ингредиенты) карты в исходном порядке"""
+        return [json.loads(data) for data, in self._db.execute(
+            'SELECT data FROM ingredient WHERE chart = ? ORDER BY position', (chart_id,))]
+
+    def charts_using(self, product_id):
+        """Карты, в которые продукт входит ингредиентом"""
+        return [json.loads(data) for data, in self._db.execute(
+            'SELECT DISTINCT chart.data FROM ingredient JOIN chart ON chart.id = ingredient.chart '
+            'WHERE ingredient.product = ?', (product_id,))]
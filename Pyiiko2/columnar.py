@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""Колоночное представление OLAP-отчетов на NumPy
+
+Строки ответа olap2 раскладываются по колонкам: поля агрегации — в массивы float64, поля
+группировки — в словарное кодирование (массив кодов int32 и список уникальных значений)::
+
+    table = OlapTable.from_response(iiko.olap2(json=request), request)
+    by_waiter = table.filter(DishCategory='Бар').group_by('WaiterName').sum('DishDiscountSumInt')
+    by_waiter.to_pandas()
+
+Требуется пакет numpy (``pip install Pyiiko2[columnar]``); для экспорта — pandas или pyarrow.
+"""
+import json
+from array import array
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('Для колоночных результатов требуется пакет numpy')
+
+
+class Categorical(object):
+    """Колонка со словарным кодированием
+
+    :attr codes: массив int32 с номерами значений в categories, -1 — пустое значение.
+    :attr categories: список уникальных значений.
+    """
+
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def encode(cls, values, count=None):
+        """Кодирует значения; для итератора без len нужно передать count"""
+        index = {}
+        codes = np.empty(len(values) if count is None else count, dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None:
+                codes[i] = -1
+            else:
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(index)
+                codes[i] = code
+        return cls(codes, list(index))
+
+    def code(self, value):
+        """Код значения или None, если значения нет в колонке"""
+        try:
+            return self.categories.index(value)
+        except ValueError:
+            return None
+
+    def take(self, indexer):
+        return Categorical(self.codes[indexer], self.categories)
+
+    def values(self):
+        return [self.categories[code] if code >= 0 else None for code in self.codes.tolist()]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __eq__(self, value):
+        code = self.code(value)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    __hash__ = None
+
+
+class OlapTable(object):
+    """Результат OLAP-отчета по колонкам
+
+    :param columns: словарь имя -> numpy-массив (поле агрегации) или :class:`Categorical` (поле группировки).
+    """
+
+    def __init__(self, columns):
+        _require_numpy()
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows, dimensions=None, measures=None):
+        """Раскладывает список строк по колонкам
+
+        :param dimensions: (optional) поля группировки; по умолчанию все нечисловые поля.
+        :param measures: (optional) поля агрегации; по умолчанию все числовые поля.
+        """
+        _require_numpy()
+        names = list(dict.fromkeys(list(dimensions or []) + list(measures or []) + list(rows[0] if rows else [])))
+        return cls({name: _column(lambda name=name: (row.get(name) for row in rows), len(rows), name,
+                                  dimensions, measures)
+                    for name in names})
+
+    @classmethod
+    def from_response(cls, response, request=None):
+        """Раскладывает ответ olap2 (response или уже разобранный словарь) по колонкам
+
+        Тело ответа разбирается сразу в буферы колонок: словари строк data не создаются.
+
+        :param request: (optional) тело запроса, из которого берутся поля группировки и агрегации.
+        """
+        _require_numpy()
+        request = request or {}
+        dimensions = list(request.get('groupByRowFields') or []) + list(request.get('groupByColFields') or [])
+        dimensions, measures = dimensions or None, request.get('aggregateFields') or None
+        if isinstance(response, dict):
+            return cls.from_rows(response.get('data', []), dimensions, measures)
+        buffers = _ColumnBuffers(measures)
+        json.loads(response.content, object_pairs_hook=buffers)
+        # объекты нумеруются по мере разбора; последний — корень ответа, data в нем — номера строк
+        rows = np.asarray(dict(buffers.last or ()).get('data') or [], dtype=np.intp)
+        names = list(dict.fromkeys(list(dimensions or []) + list(measures or []) + list(buffers.columns)))
+        columns = {}
+        for name in names:
+            buffer = buffers.columns.pop(name, None)
+            if buffer is None:
+                buffer = _ColumnBuffer(name in (measures or ()))
+            column = buffer.column(rows, buffers.count, name in (dimensions or ()))
+            if column is not None:
+                columns[name] = column
+        return cls(columns)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def dimensions(self):
+        return [name for name, column in self.columns.items() if isinstance(column, Categorical)]
+
+    @property
+    def measures(self):
+        return [name for name, column in self.columns.items() if not isinstance(column, Categorical)]
+
+    def take(self, indexer):
+        return OlapTable({name: column.take(indexer) if isinstance(column, Categorical) else column[indexer]
+                          for name, column in self.columns.items()})
+
+    def filter(self, mask=None, **equals):
+        """Отбирает строки по булевой маске и/или равенству полей группировки
+
+        ``table.filter(WaiterName='Иванов')`` сравнивает коды, не декодируя колонку.
+        """
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        for name, value in equals.items():
+            mask = mask & (self.columns[name] == value)
+        return self.take(mask)
+
+    def group_by(self, *dimensions):
+        return OlapGroupBy(self, dimensions)
+
+    def to_rows(self):
+        decoded = {name: column.values() if isinstance(column, Categorical) else column.tolist()
+                   for name, column in self.columns.items()}
+        return [dict(zip(decoded, values)) for values in zip(*decoded.values())]
+
+    def to_pandas(self):
+        """DataFrame с категориальными колонками; массивы полей агрегации не копируются"""
+        import pandas as pd
+        return pd.DataFrame({name: pd.Categorical.from_codes(column.codes, column.categories)
+                             if isinstance(column, Categorical) else column
+                             for name, column in self.columns.items()}, copy=False)
+
+    def to_arrow(self):
+        """pyarrow.Table со словарными колонками для полей группировки"""
+        import pyarrow as pa
+        arrays = {}
+        for name, column in self.columns.items():
+            if isinstance(column, Categorical):
+                arrays[name] = pa.DictionaryArray.from_arrays(pa.array(column.codes, mask=column.codes < 0),
+                                                              pa.array(column.categories))
+            else:
+                arrays[name] = pa.array(column)
+        return pa.table(arrays)
+
+
+class OlapGroupBy(object):
+    """Группировка :class:`OlapTable` по полям группировки"""
+
+    def __init__(self, table, dimensions):
+        self.table = table
+        self.dimensions = dimensions
+        if dimensions:
+            codes = np.stack([table.columns[name].codes for name in dimensions], axis=1)
+            self._keys, self._inverse = np.unique(codes, axis=0, return_inverse=True)
+            self._inverse = self._inverse.reshape(-1)
+        else:
+            self._keys = np.empty((1, 0), dtype=np.int32)
+            self._inverse = np.zeros(len(table), dtype=np.intp)
+
+    def _result(self, measures):
+        columns = {name: Categorical(self._keys[:, i].copy(), self.table.columns[name].categories)
+                   for i, name in enumerate(self.dimensions)}
+        columns.update(measures)
+        return OlapTable(columns)
+
+    def sum(self, *measures):
+        """Суммы полей агрегации по группам; пустые значения пропускаются"""
+        measures = measures or self.table.measures
+        return self._result({name: np.bincount(self._inverse, weights=np.nan_to_num(self.table.columns[name]),
+                                               minlength=len(self._keys))
+                             for name in measures})
+
+    def count(self):
+        return self._result({'count': np.bincount(self._inverse, minlength=len(self._keys)).astype(np.float64)})
+
+
+_ABSENT = -2
+
+
+class _ColumnBuffer(object):
+    """Буфер колонки при разборе JSON
+
+    Поле агрегации копится в array('d'), остальные поля — кодами в array('q') со словарем
+    значений. Код -1 — пустое значение, -2 — у объекта нет поля (или значение не скаляр).
+    """
+
+    __slots__ = ('measure', 'values', 'index')
+
+    def __init__(self, measure):
+        self.measure = measure
+        self.values = array('d') if measure else array('q')
+        self.index = {}
+
+    def _fill(self, count):
+        missing = count - len(self.values)
+        if missing > 0:
+            self.values.extend(repeat(float('nan') if self.measure else _ABSENT, missing))
+
+    def append(self, position, value):
+        self._fill(position)
+        if len(self.values) > position:
+            return  # повторяющийся ключ объекта
+        if type(value) is _Object:
+            # вложенный объект уже разложен по своим буферам, здесь от него только номер
+            self.values.append(float('nan') if self.measure else _ABSENT)
+        elif self.measure:
+            try:
+                self.values.append(float('nan') if value is None else float(value))
+            except (TypeError, ValueError):
+                self.values.append(float('nan'))
+        elif value is None:
+            self.values.append(-1)
+        else:
+            try:
+                code = self.index.setdefault(value, len(self.index))
+            except TypeError:
+                code = _ABSENT
+            self.values.append(code)
+
+    def column(self, rows, count, dimension):
+        """Колонка по номерам строк rows; None — поле встречается только вне строк"""
+        self._fill(count)
+        if self.measure:
+            return np.frombuffer(self.values, dtype=np.float64)[rows] if len(rows) else np.empty(0)
+        codes = np.frombuffer(self.values, dtype=np.int64)[rows] if len(rows) else np.empty(0, dtype=np.int64)
+        absent = codes == _ABSENT
+        if not dimension and absent.all():
+            return None
+        codes[absent] = -1
+        categories = list(self.index)
+        if not dimension and _numeric(categories):
+            return np.array(categories + [np.nan], dtype=np.float64)[codes]
+        return Categorical(codes.astype(np.int32), categories)
+
+
+class _Object(int):
+    """Номер разобранного объекта; отличает вложенный объект от числа в данных"""
+
+    __slots__ = ()
+
+
+class _ColumnBuffers(object):
+    """object_pairs_hook для json: поля каждого объекта дописываются в буферы колонок
+
+    Вместо объекта возвращается его номер, поэтому словари строк не создаются и значения
+    группировки хранятся по одному разу.
+    """
+
+    def __init__(self, measures=None):
+        self.measures = frozenset(measures or ())
+        self.columns = {}
+        self.count = 0
+        self.last = None
+
+    def __call__(self, pairs):
+        index = self.count
+        self.count += 1
+        for name, value in pairs:
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = _ColumnBuffer(name in self.measures)
+            column.append(index, value)
+        self.last = pairs
+        return _Object(index)
+
+
+def _column(values, count, name, dimensions, measures):
+    """Колонка из значений: values() каждый раз возвращает новый итератор"""
+    if name in (measures or ()) or (name not in (dimensions or ()) and _numeric(values())):
+        return np.fromiter((np.nan if value is None else value for value in values()), dtype=np.float64, count=count)
+    return Categorical.encode(values(), count)
+
+
+def _numeric(values):
+    present = False
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        present = True
+    return present
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Опрос заказов доставки iikoBiz с выделением изменений
+
+:class:`DeliveryPoller` опрашивает ``delivery_orders`` (или ``orders_courier``) и отдает только
+события: заказ создан, изменился или закрыт. Для каждого заказа хранится статус и короткий
+отпечаток содержимого; если тело ответа не изменилось целиком, оно даже не разбирается.
+Пауза между опросами растет, пока изменений нет, и сбрасывается при первом изменении::
+
+    poller = DeliveryPoller(biz, params={'organization': org_id, 'dateFrom': today, 'dateTo': tomorrow})
+    for event in poller:
+        print(event.kind, event.order_id, event.order and event.order['status'])
+
+С :class:`~Pyiiko2.aio.AsyncIikoBiz` тот же объект используется в ``async for``.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import namedtuple
+
+DEFAULT_INTERVAL = 2
+DEFAULT_MAX_INTERVAL = 30
+DEFAULT_BACKOFF = 1.5
+CLOSED_STATUSES = ('CLOSED', 'CANCELLED', 'DELIVERED', 'Закрыта', 'Отменена', 'Доставлена')
+
+CREATED = 'created'
+CHANGED = 'changed'
+CLOSED = 'closed'
+
+
+class OrderEvent(namedtuple('OrderEvent', 'kind order_id order previous_status')):
+    """Изменение заказа
+
+    :attr kind: ``created``, ``changed`` или ``closed``.
+    :attr order: заказ из ответа; None, если заказ пропал из списка.
+    :attr previous_status: статус при прошлом опросе или None для нового заказа.
+    """
+
+    __slots__ = ()
+
+
+def fingerprint(order):
+    return hashlib.blake2b(json.dumps(order, sort_keys=True, ensure_ascii=False).encode('utf-8'),
+                           digest_size=8).digest()
+
+
+class DeliveryPoller(object):
+    """Опрос заказов доставки с выдачей только изменений
+
+    :param biz: IikoBiz или AsyncIikoBiz.
+    :param params: (optional) параметры метода, например organization, dateFrom, dateTo.
+    :param method: ``delivery_orders`` или ``orders_courier``.
+    :param interval: пауза между опросами, когда заказы меняются.
+    :param max_interval: наибольшая пауза, когда изменений нет.
+    :param backoff: во сколько раз увеличивать паузу после опроса без изменений.
+    :param closed_statuses: статусы, при переходе в которые заказ считается закрытым.
+    """
+
+    def __init__(self, biz, params=None, method='delivery_orders', interval=DEFAULT_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, closed_statuses=CLOSED_STATUSES):
+        self.biz = biz
+        self.params = params or {}
+        self.method = method
+        self.min_interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.closed_statuses = frozenset(closed_statuses)
+        self.interval = interval
+        self._body = None
+        self._orders = {}
+
+    def __len__(self):
+        """Количество открытых заказов"""
+        return len(self._orders)
+
+    def _diff(self, response):
+        response.raise_for_status()
+        body = hashlib.blake2b(response.content, digest_size=16).digest()
+        if body == self._body:
+            return []
+        self._body = body
+        result = response.json()
+        orders = result.get('deliveryOrders', []) if isinstance(result, dict) else result
+        events = []
+        previous = dict(self._orders)
+        current = {}
+        for order in orders:
+            order_id = order.get('orderId')
+            status = order.get('status')
+            seen = previous.pop(order_id, None)
+            if status in self.closed_statuses:
+                if seen is not None:
+                    events.append(OrderEvent(CLOSED, order_id, order, seen[0]))
+                continue
+            digest = fingerprint(order)
+            current[order_id] = (status, digest)
+            if seen is None:
+                events.append(OrderEvent(CREATED, order_id, order, None))
+            elif seen[1] != digest:
+                events.append(OrderEvent(CHANGED, order_id, order, seen[0]))
+        for order_id, (status, _) in previous.items():
+            events.append(OrderEvent(CLOSED, order_id, None, status))
+        self._orders = current
+        return events
+
+    def _adapt(self, events):
+        if events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def poll(self):
+        """Один опрос
+
+        :returns: список :class:`OrderEvent`.
+        """
+        events = self._diff(getattr(self.biz, self.method)(**self.params))
+        self._adapt(events)
+        return events
+
+    async def async_poll(self):
+        events = self._diff(await getattr(self.biz, self.method)(**self.params))
+        self._adapt(events)
+        return events
+
+    def __iter__(self):
+        while True:
+            yield from self.poll()
+            time.sleep(self.interval)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        while True:
+            for event in await self.async_poll():
+                yield event
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Иерархия подразделений и отчеты по поддереву
+
+:class:`DepartmentTree` строится из плоского списка corporateItemDto (``departments()``) и
+отвечает на вопросы о родителе, детях, предках и поддереве без повторного обхода списка.
+:func:`report_subtree` запускает отчет по каждому подразделению поддерева параллельно и сводит
+строки в одну таблицу::
+
+    tree = DepartmentTree.load(iiko)
+    for department in tree.subtree(jurperson_id, types=('DEPARTMENT',)):
+        print(department.name, [a.name for a in tree.ancestors(department.id)])
+    report = report_subtree(iiko, tree, tree.roots()[0].id, 'sales', dateFrom='01.01.2020', dateTo='31.01.2020')
+    report['data'], report['errors']
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from defusedxml.ElementTree import parse
+
+from .xmlstream import element_to_dict
+
+TYPES = ('CORPORATION', 'JURPERSON', 'ORGDEVELOPMENT', 'DEPARTMENT', 'MANUFACTURE', 'CENTRALSTORE',
+         'CENTRALOFFICE', 'SALEPOINT', 'STORE')
+DEFAULT_WORKERS = 4
+
+
+class DepartmentNode(object):
+    """Подразделение: поля corporateItemDto
+
+    :attr data: все поля элемента (словарь, см. :func:`~Pyiiko2.xmlstream.element_to_dict`).
+    """
+    __slots__ = ('id', 'parent_id', 'code', 'name', 'type', 'data')
+
+    def __init__(self, data):
+        self.id = data.get('id')
+        self.parent_id = data.get('parentId') or None
+        self.code = data.get('code') or None
+        self.name = data.get('name')
+        self.type = data.get('type')
+        self.data = data
+
+    def __repr__(self):
+        return '<DepartmentNode %s %s>' % (self.type, self.name)
+
+
+class DepartmentTree(object):
+    """Дерево подразделений
+
+    :param items: словари corporateItemDto.
+    """
+
+    def __init__(self, items):
+        self._nodes = {}
+        self._children = {}
+        for item in items:
+            department = DepartmentNode(item)
+            self._nodes[department.id] = department
+        for department in self._nodes.values():
+            parent = department.parent_id if department.parent_id in self._nodes else None
+            self._children.setdefault(parent, []).append(department)
+
+    @classmethod
+    def from_xml(cls, text):
+        """Дерево из ответа ``api/corporation/departments``"""
+        root = parse(StringIO(text)).getroot()
+        return cls(element_to_dict(element) for element in root.iter('corporateItemDto'))
+
+    @classmethod
+    def load(cls, server, **params):
+        response = server.departments(**params)
+        response.raise_for_status()
+        return cls.from_xml(response.text)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._nodes.values())
+
+    def __contains__(self, id):
+        return id in self._nodes
+
+    def __getitem__(self, id):
+        return self._nodes[id]
+
+    def get(self, id):
+        return self._nodes.get(id)
+
+    def roots(self):
+        """Подразделения без родителя (обычно одна корпорация)"""
+        return list(self._children.get(None, ()))
+
+    def parent(self, id):
+        parent_id = self._nodes[id].parent_id
+        return self._nodes.get(parent_id)
+
+    def children(self, id, types=None):
+        """Непосредственные дочерние подразделения"""
+        children = self._children.get(id, ())
+        return [child for child in children if types is None or child.type in types]
+
+    def ancestors(self, id):
+        """Предки от родителя до корня"""
+        result = []
+        department = self.parent(id)
+        while department is not None and department not in result:
+            result.append(department)
+            department = self.parent(department.id)
+        return result
+
+    def subtree(self, id, types=None, include_self=True):
+        """Подразделение и все его потомки в порядке обхода в глубину
+
+        :param types: (optional) только подразделения этих типов; обход продолжается и через \
+        подразделения других типов.
+        """
+        result = []
+        stack = [self._nodes[id]] if include_self else list(reversed(self._children.get(id, ())))
+        seen = set()
+        while stack:
+            department = stack.pop()
+            if department.id in seen:
+                continue
+            seen.add(department.id)
+            if types is None or department.type in types:
+                result.append(department)
+            stack.extend(reversed(self._children.get(department.id, ())))
+        return result
+
+    def of_type(self, *types):
+        return [department for department in self._nodes.values() if department.type in types]
+
+    def path(self, id):
+        """Названия от корня до подразделения"""
+        return [department.name for department in reversed(self.ancestors(id))] + [self._nodes[id].name]
+
+
+def report_rows(response, department):
+    """Строки XML-ответа отчета с добавленными полями ``department`` и ``departmentName``"""
+    response.raise_for_status()
+    rows = []
+    for element in parse(StringIO(response.text)).getroot():
+        row = element_to_dict(element)
+        if not isinstance(row, dict):
+            row = {element.tag: row}
+        row['department'] = department.id
+        row['departmentName'] = department.name
+        rows.append(row)
+    return rows
+
+
+def report_subtree(server, tree, root_id, method, types=('DEPARTMENT',), max_workers=DEFAULT_WORKERS,
+                   rows=report_rows, **kwargs):
+    """Выполняет отчет по каждому подразделению поддерева параллельно и сводит строки
+
+    :param server: IikoServer.
+    :param tree: :class:`DepartmentTree`.
+    :param root_id: корень поддерева.
+    :param method: метод отчета с параметром department, например ``sales``, ``product_expense``, \
+    ``mounthly_plan``.
+    :param types: типы подразделений, по которым строится отчет.
+    :param max_workers: максимальное количество одновременных запросов.
+    :param rows: функция (response, department) -> список строк.
+    :param kwargs: остальные параметры отчета.
+
+    :returns: словарь ``{'data': [...], 'errors': {id подразделения: исключение}}``; строки идут в \
+    порядке обхода поддерева.
+    """
+    departments = tree.subtree(root_id, types=types)
+
+    def run(department):
+        return rows(getattr(server, method)(department=department.id, **kwargs), department)
+
+    data, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(department, executor.submit(run, department)) for department in departments]
+        for department, future in futures:
+            try:
+                data.extend(future.result())
+            except Exception as e:
+                errors[department.id] = e
+    return {'data': data, 'errors': errors}
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Непрерывное чтение событий iikoServerApi по ревизиям
+
+:class:`EventTail` опрашивает ``api/events`` начиная с сохраненной ревизии, разбирает ответ
+потоково и отдает события по одному::
+
+    tail = EventTail(iiko, '/var/lib/pyiiko/events.json')
+    for event in tail:
+        print(event['type'], event['id'])
+
+С асинхронным клиентом тот же объект используется в ``async for``. Ревизия и окно недавних id
+событий записываются в файл атомарно, поэтому после перезапуска чтение продолжается с того же
+места, а события, уже отданные до остановки, повторно не выдаются.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+import requests
+
+from .xmlstream import RecordParser, CHUNK_SIZE
+
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_DEDUP_WINDOW = 10000
+
+
+def event_to_dict(element):
+    """Преобразует элемент ``<event>`` в словарь
+
+    Атрибуты события собираются в словарь ``attributes`` по имени атрибута.
+    """
+    event = {'attributes': {}}
+    for child in element:
+        if child.tag == 'attribute':
+            event['attributes'][child.findtext('name')] = child.findtext('value')
+        else:
+            event[child.tag] = child.text
+    return event
+
+
+class EventCheckpoint(object):
+    """Сохраненная позиция чтения событий
+
+    :param path: путь к файлу с ревизией.
+    :param window: сколько последних id событий помнить для отсева дублей.
+    """
+
+    def __init__(self, path, window=DEFAULT_DEDUP_WINDOW):
+        self.path = path
+        self.window = window
+        self.revision = None
+        self.seen = OrderedDict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.revision = checkpoint.get('revision')
+        self.seen = OrderedDict.fromkeys(checkpoint.get('seen', [])[-self.window:])
+
+    def save(self):
+        tmp = self.path + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump({'revision': self.revision, 'seen': list(self.seen)}, f)
+        os.replace(tmp, self.path)
+
+    def is_new(self, event_id):
+        """Проверяет id события и запоминает его; событие без id всегда считается новым"""
+        if event_id is None:
+            return True
+        if event_id in self.seen:
+            return False
+        self.seen[event_id] = None
+        if len(self.seen) > self.window:
+            self.seen.popitem(last=False)
+        return True
+
+
+class EventTail(object):
+    """Итератор событий сервера, продолжающий чтение с сохраненной ревизии
+
+    :param server: IikoServer или AsyncIikoServer.
+    :param checkpoint: путь к файлу позиции или :class:`EventCheckpoint`.
+    :param interval: пауза в секундах между опросами, когда новых событий нет.
+    :param follow: ждать новые события; если False, итерация заканчивается, когда события прочитаны.
+    :param params: (optional) дополнительные параметры ``api/events``, например from_time.
+    """
+
+    def __init__(self, server, checkpoint, interval=DEFAULT_POLL_INTERVAL, follow=True, params=None,
+                 chunk_size=CHUNK_SIZE):
+        self.server = server
+        self.checkpoint = checkpoint if isinstance(checkpoint, EventCheckpoint) else EventCheckpoint(checkpoint)
+        self.interval = interval
+        self.follow = follow
+        self.params = params or {}
+        self.chunk_size = chunk_size
+
+    def _params(self):
+        params = dict(self.params)
+        if self.checkpoint.revision is not None:
+            params['from_rev'] = self.checkpoint.revision
+        return params
+
+    def _advance(self, parser):
+        """Сдвигает ревизию на следующую после полученной; возвращает True, если ревизия изменилась"""
+        revision = parser.values.get('revision')
+        if revision is None:
+            return False
+        revision = int(revision) + 1
+        changed = revision != self.checkpoint.revision
+        self.checkpoint.revision = revision
+        return changed
+
+    def _check(self, response):
+        """Любой ответ, кроме 200, — ошибка: 204 и 3xx не содержат страницы событий"""
+        if response.status_code != 200:
+            response.close()
+            raise requests.HTTPError('%s Error for url: %s' % (response.status_code, response.url),
+                                     response=response)
+
+    def __iter__(self):
+        try:
+            while True:
+                response = self.server.get('api/events', params=self._params(), stream=True)
+                self._check(response)
+                parser = RecordParser('event')
+                new = 0
+                try:
+                    for chunk in response.iter_content(self.chunk_size):
+                        for element in parser.feed(chunk):
+                            event = event_to_dict(element)
+                            if self.checkpoint.is_new(event.get('id')):
+                                new += 1
+                                yield event
+                    for element in parser.close():
+                        event = event_to_dict(element)
+                        if self.checkpoint.is_new(event.get('id')):
+                            new += 1
+                            yield event
+                finally:
+                    response.close()
+                changed = self._advance(parser)
+                self.checkpoint.save()
+                if not new and not changed:
+                    if not self.follow:
+                        return
+                    time.sleep(self.interval)
+        finally:
+            # Ревизия сохраняется только после полной страницы, а отданные события запоминаются всегда
+            self.checkpoint.save()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        try:
+            while True:
+                response = await self.server.get('api/events', params=self._params(), stream=True)
+                self._check(response)
+                parser = RecordParser('event')
+                new = 0
+                try:
+                    async for chunk in response.iter_content(self.chunk_size):
+                        for element in parser.feed(chunk):
+                            event = event_to_dict(element)
+                            if self.checkpoint.is_new(event.get('id')):
+                                new += 1
+                                yield event
+                    for element in parser.close():
+                        event = event_to_dict(element)
+                        if self.checkpoint.is_new(event.get('id')):
+                            new += 1
+                            yield event
+                finally:
+                    response.close()
+                changed = self._advance(parser)
+                self.checkpoint.save()
+                if not new and not changed:
+                    if not self.follow:
+                        return
+                    await asyncio.sleep(self.interval)
+        finally:
+            self.checkpoint.save()
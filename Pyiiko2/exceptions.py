@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Исключения клиентов iiko
+
+Исключения наследуют соответствующие классы requests, поэтому существующие обработчики
+``requests.exceptions.RequestException`` продолжают их перехватывать.
+"""
+import requests
+
+
+class IikoError(requests.exceptions.RequestException):
+    """Базовое исключение клиентов iiko"""
+
+
+class IikoConnectionError(IikoError, requests.exceptions.ConnectionError):
+    """Не удалось соединиться с сервером или соединение оборвалось"""
+
+
+class IikoTimeout(IikoError, requests.exceptions.Timeout):
+    """Сервер не ответил за отведенное время"""
+
+
+class CircuitOpenError(IikoConnectionError):
+    """Сервер недавно не отвечал, запрос не отправлялся"""
+
+
+class IikoAuthError(IikoError):
+    """Сервер не выдал токен (неверный логин или пароль, нет свободной лицензии)"""
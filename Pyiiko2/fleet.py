@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Параллельные вызовы методов IikoServer для сети ресторанов
+
+:class:`IikoFleet` держит клиентов многих серверов и выполняет любой метод на всех сразу.
+Результаты возвращаются по мере готовности, каждый помечен именем сервера, а ошибка одного
+сервера не прерывает остальные::
+
+    fleet = IikoFleet({
+        'center': {'ip': '10.0.0.1', 'port': 8080, 'login': 'api', 'passhash': passhash},
+        'mall': {'ip': '10.0.0.2', 'port': 8080, 'login': 'api', 'passhash': passhash, 'timeout': 60},
+    }, max_workers=32)
+    fleet.login()
+    for result in fleet.map('sales', department=department, dateFrom='01.01.2020', dateTo='31.01.2020'):
+        if result.ok:
+            print(result.name, result.value.text)
+        else:
+            print(result.name, result.error)
+"""
+import time
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from .server import IikoServer
+
+DEFAULT_WORKERS = 16
+DEFAULT_PER_SERVER = 1
+
+
+class FleetResult(namedtuple('FleetResult', 'name method value error elapsed')):
+    """Результат вызова метода на одном сервере
+
+    :attr name: имя сервера.
+    :attr value: значение, возвращенное методом.
+    :attr error: исключение или None.
+    :attr elapsed: длительность вызова в секундах.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class IikoFleet(object):
+    """Набор серверов с общим пулом потоков
+
+    :param servers: словарь имя -> IikoServer или словарь параметров IikoServer.
+    :param max_workers: максимальное количество одновременных вызовов по всем серверам.
+    :param per_server: максимальное количество одновременных вызовов к одному серверу.
+    """
+
+    def __init__(self, servers, max_workers=DEFAULT_WORKERS, per_server=DEFAULT_PER_SERVER):
+        self.servers = {name: server if isinstance(server, IikoServer) else IikoServer(**server)
+                        for name, server in servers.items()}
+        self.max_workers = max_workers
+        self.per_server = per_server
+
+    def __len__(self):
+        return len(self.servers)
+
+    def __iter__(self):
+        return iter(self.servers.items())
+
+    def __getitem__(self, name):
+        return self.servers[name]
+
+    def close(self):
+        for server in self.servers.values():
+            server.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def login(self):
+        """Получает токены на всех серверах
+
+        :returns: словарь имя -> :class:`FleetResult`.
+        """
+        return {result.name: result for result in self.map('login')}
+
+    def map(self, method, *args, **kwargs):
+        """Вызывает метод с одинаковыми аргументами на всех серверах
+
+        :returns: генератор :class:`FleetResult` в порядке завершения.
+        """
+        return self.submit((name, method, args, kwargs) for name in self.servers)
+
+    def submit(self, calls):
+        """Выполняет набор вызовов, соблюдая общий лимит и лимит на сервер
+
+        :param calls: итерируемые кортежи (имя сервера, метод, args, kwargs); к одному серверу \
+        может быть несколько вызовов, например по разным подразделениям.
+        :returns: генератор :class:`FleetResult` в порядке завершения.
+        """
+        pending = deque(calls)
+        running = {}
+        active = dict.fromkeys(self.servers, 0)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                deferred = deque()
+                while pending and len(running) < self.max_workers:
+                    call = pending.popleft()
+                    if active[call[0]] >= self.per_server:
+                        deferred.append(call)
+                        continue
+                    active[call[0]] += 1
+                    running[executor.submit(self._call, *call)] = call[0]
+                pending.extendleft(reversed(deferred))
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    active[running.pop(future)] -= 1
+                    yield future.result()
+
+    def _call(self, name, method, args, kwargs):
+        started = time.monotonic()
+        value = error = None
+        try:
+            value = getattr(self.servers[name], method)(*args, **kwargs)
+            if isinstance(value, requests.Response) and not value.ok:
+                error = requests.HTTPError('%s %s' % (value.status_code, value.reason), response=value)
+        except Exception as e:
+            error = e
+        return FleetResult(name, method, value, error, time.monotonic() - started)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Потоковая выгрузка строк приходных и расходных накладных
+
+Период делится на окна (и, если заданы, на поставщиков), окна запрашиваются параллельно и
+разбираются потоково. Строки накладных отдаются в порядке окон и поставщиков независимо от
+того, какое окно загрузилось первым; готовые, но еще не отданные окна ждут своей очереди во
+временных файлах, поэтому память не зависит от длины периода::
+
+    exporter = InvoiceExporter(iiko, window='week', max_workers=4)
+    exporter.to_csv('invoices-2020.csv', '2020-01-01', '2020-12-31')
+    exporter.to_ndjson('invoices-2020.ndjson', '2020-01-01', '2020-12-31')
+    for line in exporter.lines('2020-01-01', '2020-01-31'):
+        print(line['document.documentNumber'], line['product'], line['sum'])
+"""
+import csv
+import datetime
+import json
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .exceptions import IikoError
+from .olap import split_period, DEFAULT_RETRIES, DEFAULT_BACKOFF
+
+DEFAULT_WINDOW = 'month'
+DEFAULT_WORKERS = 4
+SPOOL_SIZE = 1024 * 1024
+
+METHODS = {'in': 'invoice_in', 'out': 'invoice_out'}
+
+DEFAULT_FIELDS = (
+    'document.id', 'document.documentNumber', 'document.incomingDocumentNumber', 'document.dateIncoming',
+    'document.incomingDate', 'document.status', 'document.supplier', 'document.counteragentId',
+    'document.defaultStore', 'num', 'product', 'productArticle', 'amount', 'amountUnit', 'actualAmount',
+    'price', 'priceWithoutVat', 'sum', 'vatPercent', 'vatSum', 'discountSum', 'store',
+)
+
+
+class ExportWindowError(Exception):
+    """Окно выгрузки не удалось получить после всех повторов"""
+
+    def __init__(self, date_from, date_to, supplier, reason):
+        super().__init__('Накладные %s - %s%s: %s' % (date_from, date_to,
+                                                       ' поставщик %s' % supplier if supplier else '', reason))
+        self.date_from = date_from
+        self.date_to = date_to
+        self.supplier = supplier
+        self.reason = reason
+
+
+def _leaves(element, prefix=''):
+    return {prefix + child.tag: (child.text or '').strip() for child in element if len(child) == 0}
+
+
+def invoice_lines(document):
+    """Строки накладной: поля строки и поля документа с префиксом ``document.``"""
+    header = _leaves(document, 'document.')
+    items = document.find('items')
+    for item in (items if items is not None else ()):
+        line = dict(header)
+        line.update(_leaves(item))
+        yield line
+
+
+def _date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class InvoiceExporter(object):
+    """Выгрузка строк накладных за длинный период
+
+    :param server: IikoServer.
+    :param direction: ``in`` — приходные накладные, ``out`` — расходные.
+    :param window: ``day``, ``week`` или ``month``.
+    :param suppliers: (optional) id поставщиков; каждый поставщик запрашивается отдельно.
+    :param max_workers: максимальное количество одновременно загружаемых окон.
+    :param retries: сколько раз повторять окно, завершившееся ошибкой.
+    :param backoff: :class:`~Pyiiko2.retry.RetryPolicy` с паузой между повторами окна.
+    """
+
+    def __init__(self, server, direction='in', window=DEFAULT_WINDOW, suppliers=None, max_workers=DEFAULT_WORKERS,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.server = server
+        self.method = METHODS[direction]
+        self.window = window
+        self.suppliers = list(suppliers) if suppliers else [None]
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+
+    def shards(self, date_from, date_to):
+        """Окна выгрузки по порядку: список (начало, конец включительно, поставщик)"""
+        windows = split_period(_date(date_from), _date(date_to) + datetime.timedelta(days=1), self.window)
+        return [(start, end - datetime.timedelta(days=1), supplier)
+                for start, end in windows for supplier in self.suppliers]
+
+    def _fetch(self, date_from, date_to, supplier):
+        """Загружает окно во временный файл строк JSON"""
+        params = {'from': date_from.isoformat(), 'to': date_to.isoformat()}
+        if supplier:
+            params['supplierId'] = supplier
+        reason = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff.delay(attempt - 1))
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8')
+            try:
+                for document in getattr(self.server, self.method)(records='document', **params):
+                    for line in invoice_lines(document):
+                        spool.write(json.dumps(line, ensure_ascii=False) + '\n')
+            except (IikoError, requests.HTTPError) as e:
+                spool.close()
+                reason = e
+                continue
+            except BaseException:
+                spool.close()
+                raise
+            spool.seek(0)
+            return spool
+        raise ExportWindowError(date_from, date_to, supplier, reason)
+
+    def lines(self, date_from, date_to):
+        """Генератор строк накладных за период в порядке окон и поставщиков
+
+        :param date_from: (YYYY-MM-DD) начальная дата.
+        :param date_to: (YYYY-MM-DD) конечная дата, входит в период.
+        :raises ExportWindowError: окно не удалось получить.
+        """
+        shards = deque(self.shards(date_from, date_to))
+        running = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while shards or running:
+                    # загружается не больше max_workers окон вперед от отдаваемого
+                    while shards and len(running) < self.max_workers:
+                        running.append(executor.submit(self._fetch, *shards.popleft()))
+                    spool = running.popleft().result()
+                    with spool:
+                        for row in spool:
+                            yield json.loads(row)
+            finally:
+                for future in running:
+                    if not future.cancel() and future.exception() is None:
+                        future.result().close()
+
+    def export(self, sink, date_from, date_to):
+        """Передает строки в sink(line) по одной
+
+        :returns: количество строк.
+        """
+        count = 0
+        for line in self.lines(date_from, date_to):
+            sink(line)
+            count += 1
+        return count
+
+    def to_ndjson(self, path, date_from, date_to):
+        """Записывает строки в файл NDJSON (одна строка JSON на строку накладной)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            return self.export(lambda line: f.write(json.dumps(line, ensure_ascii=False) + '\n'), date_from, date_to)
+
+    def to_csv(self, path, date_from, date_to, fields=DEFAULT_FIELDS):
+        """Записывает строки в CSV с колонками fields; остальные поля отбрасываются"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(fields), extrasaction='ignore')
+            writer.writeheader()
+            return self.export(writer.writerow, date_from, date_to)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Общий токен iikoServerApi для нескольких процессов и потоков
+
+Каждая авторизация занимает слот лицензии, поэтому процессы одного хоста, работающие с одним
+сервером под одним логином, должны пользоваться одним токеном. :class:`TokenLease` хранит токен
+в файле (по одному файлу на пару сервер + логин), доступ к которому защищен файловой блокировкой::
+
+    lease = TokenLease('/var/run/pyiiko')
+    iiko = IikoServer(ip=ip, port=port, login=login, passhash=passhash, lease=lease)
+    iiko.stores()   # токен берется из аренды, авторизация выполняется только при необходимости
+
+Токен обновляется заранее, за ``refresh_margin`` секунд до истечения ``ttl``, а при ответе 401
+клиент один раз прозрачно получает новый токен и повторяет запрос.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .exceptions import IikoAuthError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+DEFAULT_TOKEN_TTL = 900
+DEFAULT_REFRESH_MARGIN = 60
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+class FileLock(object):
+    """Эксклюзивная блокировка файла между процессами и потоками"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = _thread_lock(path)
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:  # pragma: no cover
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        except Exception:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._release()
+
+    def _release(self):
+        if self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+class TokenLease(object):
+    """Менеджер аренды токенов с файловым хранилищем
+
+    :param directory: каталог для файлов аренды, по умолчанию системный временный каталог.
+    :param ttl: время жизни токена в секундах с момента авторизации.
+    :param refresh_margin: за сколько секунд до истечения ttl токен обновляется.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TOKEN_TTL, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'pyiiko2-tokens')
+        os.makedirs(self.directory, exist_ok=True)
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._cache = {}
+
+    def _key(self, client):
+        return hashlib.sha1((client.address + '\n' + str(client._login)).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _read(self, key):
+        try:
+            with open(self._path(key)) as f:
+                lease = json.load(f)
+            return lease['token'], lease['expires']
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _write(self, key, token, expires):
+        path = self._path(key)
+        tmp = path + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump({'token': token, 'expires': expires}, f)
+        os.replace(tmp, path)
+        self._cache[key] = (token, expires)
+
+    def _fresh(self, expires):
+        return expires - self.refresh_margin > time.time()
+
+    def _renew(self, client, key, stale):
+        """Получает новый токен и отпускает слот лицензии устаревшего"""
+        expires = time.time() + self.ttl
+        login = client._auth()
+        if login is None or login.status_code != 200:
+            raise IikoAuthError('Не удалось получить токен: ' +
+                                (login.text if login is not None else 'нет ответа сервера'), response=login)
+        self._write(key, login.text, expires)
+        if stale is not None:
+            client._revoke(stale)
+        return login.text
+
+    def token(self, client):
+        """Возвращает действующий токен для клиента, при необходимости авторизуясь
+
+        :param client: IikoServer
+        :returns: token
+        :raises IikoAuthError: сервер не выдал токен.
+        """
+        key = self._key(client)
+        token, expires = self._cache.get(key, (None, 0))
+        if token is not None and self._fresh(expires):
+            return token
+        with FileLock(self._path(key) + '.lock'):
+            token, expires = self._read(key)
+            if token is not None and self._fresh(expires):
+                self._cache[key] = (token, expires)
+                return token
+            return self._renew(client, key, token)
+
+    def invalidate(self, client, token):
+        """Сообщает, что сервер отверг токен, и возвращает действующий
+
+        Если другой процесс уже обновил токен, повторная авторизация не выполняется.
+        """
+        key = self._key(client)
+        with FileLock(self._path(key) + '.lock'):
+            current, expires = self._read(key)
+            if current is not None and current != token and self._fresh(expires):
+                self._cache[key] = (current, expires)
+                return current
+            return self._renew(client, key, None)
+
+    def release(self, client):
+        """Уничтожает общий токен и освобождает слот лицензии
+
+        Вызывается один раз при остановке всех процессов, использующих аренду.
+        """
+        key = self._key(client)
+        with FileLock(self._path(key) + '.lock'):
+            token, expires = self._read(key)
+            self._cache.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            if token is not None:
+                return client._revoke(token)
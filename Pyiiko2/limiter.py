@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Адаптивное ограничение нагрузки на сервер
+
+:class:`AdaptiveLimiter` сочетает token bucket (не больше ``rate`` запросов в секунду) и
+AIMD-регулирование количества одновременных запросов: при ошибках 5xx/429, таймаутах и росте
+задержки выше ``latency_target`` лимит уменьшается в ``decrease`` раз, а пока сервер отвечает
+быстро — растет примерно на ``increase`` за каждый «круг» запросов::
+
+    limiter = AdaptiveLimiter(rate=20, max_limit=16, latency_target=2.0)
+    iiko = IikoServer(ip=ip, port=port, login=login, passhash=passhash, limiter=limiter)
+
+Один ограничитель можно передать нескольким клиентам одного сервера, в том числе асинхронным.
+"""
+import asyncio
+import threading
+import time
+
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 32
+DEFAULT_LATENCY_TARGET = 2.0
+DEFAULT_DECREASE = 0.5
+DEFAULT_INCREASE = 1.0
+_MAX_WAIT = 0.05
+
+
+class LimiterTimeout(Exception):
+    """Не удалось дождаться разрешения на запрос"""
+
+
+class _Slot(object):
+    """Разрешение на один запрос; при выходе сообщает ограничителю результат"""
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._ok = None
+
+    def record(self, status_code):
+        self._ok = status_code < 500 and status_code != 429
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._limiter._release(time.monotonic() - self._started, exc_type is None and self._ok is not False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.__exit__(exc_type, exc_value, traceback)
+
+
+class AdaptiveLimiter(object):
+    """Ограничитель частоты и параллельности запросов к одному серверу
+
+    :param rate: (optional) запросов в секунду; None — без ограничения частоты.
+    :param burst: емкость token bucket, по умолчанию равна rate.
+    :param initial: начальный лимит одновременных запросов.
+    :param min_limit: нижняя граница лимита.
+    :param max_limit: верхняя граница лимита.
+    :param latency_target: задержка в секундах, выше которой сервер считается перегруженным.
+    :param decrease: множитель лимита при перегрузке.
+    :param increase: прирост лимита за круг успешных запросов.
+    """
+
+    def __init__(self, rate=None, burst=None, initial=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT,
+                 max_limit=DEFAULT_MAX_LIMIT, latency_target=DEFAULT_LATENCY_TARGET, decrease=DEFAULT_DECREASE,
+                 increase=DEFAULT_INCREASE):
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.increase = increase
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._decreased = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """Текущий лимит одновременных запросов"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def _try_acquire(self):
+        """Возвращает 0, если разрешение получено, иначе сколько секунд подождать"""
+        if self._in_flight >= int(self._limit):
+            return None
+        if self.rate is not None:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self._in_flight += 1
+        return 0
+
+    def acquire(self, timeout=None):
+        """Ожидает разрешения на запрос
+
+        :returns: контекстный менеджер, который нужно закрыть после получения ответа.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return _Slot(self)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LimiterTimeout('Превышено время ожидания ограничителя запросов')
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    async def async_acquire(self, timeout=None):
+        """Асинхронный вариант :meth:`acquire`, не блокирующий цикл событий"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+            if wait == 0:
+                return _Slot(self)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LimiterTimeout('Превышено время ожидания ограничителя запросов')
+            await asyncio.sleep(_MAX_WAIT if wait is None else min(wait, _MAX_WAIT))
+
+    def _release(self, latency, ok):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if not ok or latency > self.latency_target:
+                # Не уменьшаем лимит повторно из-за запросов, начатых до предыдущего уменьшения
+                if now - latency >= self._decreased:
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+                    self._decreased = now
+            else:
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            self._cond.notify_all()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Метрики запросов клиентов iiko
+
+Клиент, которому передан объект :class:`Metrics`, учитывает каждый запрос: количество по кодам
+ответа, гистограмму длительности, объем ответа, повторы и таймауты. Метрики группируются по
+логическому адресу метода API (``api/reports/olap``, ``api/0/orders/deliveryOrders``), а не по
+полному URL: токен и параметры отбрасываются, идентификаторы в пути заменяются на ``{id}``::
+
+    metrics = Metrics()
+    metrics.on_response(lambda event: log.info('%(endpoint)s %(status)s %(elapsed).3f', event))
+    iiko = IikoServer(ip=ip, port=port, login=login, passhash=passhash, metrics=metrics)
+    ...
+    print(prometheus_text(metrics))
+"""
+import re
+import threading
+from collections import defaultdict
+
+from .exceptions import IikoTimeout
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_ID = re.compile(r'^(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def endpoint_label(path):
+    """Логический адрес метода: путь без параметров, идентификаторы заменены на {id}"""
+    path = path.split('?', 1)[0].strip('/')
+    return '/'.join('{id}' if _ID.match(part) else part for part in path.split('/'))
+
+
+class _Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics(object):
+    """Накопитель метрик, общий для любого количества клиентов
+
+    :param buckets: границы гистограммы длительности запросов в секундах.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._durations = {}
+        self._bytes = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._timeouts = defaultdict(int)
+        self._request_hooks = []
+        self._response_hooks = []
+
+    def on_request(self, hook):
+        """Регистрирует hook(event), вызываемый перед каждой попыткой запроса
+
+        event — словарь с ключами endpoint, method, attempt.
+        """
+        self._request_hooks.append(hook)
+        return hook
+
+    def on_response(self, hook):
+        """Регистрирует hook(event), вызываемый после каждой попытки запроса
+
+        event — словарь с ключами endpoint, method, attempt, status (None при ошибке), elapsed, bytes, error.
+        """
+        self._response_hooks.append(hook)
+        return hook
+
+    def request_started(self, endpoint, method, attempt):
+        if attempt:
+            with self._lock:
+                self._retries[endpoint, method] += 1
+        if self._request_hooks:
+            event = {'endpoint': endpoint, 'method': method, 'attempt': attempt}
+            for hook in self._request_hooks:
+                hook(event)
+
+    def request_finished(self, endpoint, method, attempt, status, elapsed, size, error=None):
+        key = (endpoint, method)
+        with self._lock:
+            self._requests[endpoint, method, str(status) if status is not None else 'error'] += 1
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = _Histogram(self.buckets)
+            histogram.observe(elapsed)
+            self._bytes[key] += size
+            if isinstance(error, IikoTimeout):
+                self._timeouts[key] += 1
+        if self._response_hooks:
+            event = {'endpoint': endpoint, 'method': method, 'attempt': attempt, 'status': status,
+                     'elapsed': elapsed, 'bytes': size, 'error': error}
+            for hook in self._response_hooks:
+                hook(event)
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._durations.clear()
+            self._bytes.clear()
+            self._retries.clear()
+            self._timeouts.clear()
+
+    def snapshot(self):
+        """Текущие значения метрик по логическим адресам
+
+        :returns: словарь endpoint -> {method -> {'requests': {status: n}, 'count', 'sum', 'buckets', \
+        'bytes', 'retries', 'timeouts'}}.
+        """
+        result = {}
+        with self._lock:
+            for (endpoint, method, status), value in self._requests.items():
+                result.setdefault(endpoint, {}).setdefault(method, {'requests': {}})['requests'][status] = value
+            for (endpoint, method), histogram in self._durations.items():
+                item = result.setdefault(endpoint, {}).setdefault(method, {'requests': {}})
+                item.update(count=histogram.count, sum=histogram.sum,
+                            buckets=dict(zip(self.buckets, histogram.counts)),
+                            bytes=self._bytes[endpoint, method], retries=self._retries[endpoint, method],
+                            timeouts=self._timeouts[endpoint, method])
+        return result
+
+    def prometheus(self):
+        return prometheus_text(self)
+
+
+def _labels(**labels):
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                       .replace('\n', '\\n')) for name, value in labels.items()) + '}'
+
+
+def prometheus_text(metrics, prefix='iiko'):
+    """Метрики в текстовом формате Prometheus (exposition format 0.0.4)"""
+    lines = []
+    with metrics._lock:
+        lines += ['# HELP %s_requests_total Количество запросов к API iiko.' % prefix,
+                  '# TYPE %s_requests_total counter' % prefix]
+        for (endpoint, method, status), value in sorted(metrics._requests.items()):
+            lines.append('%s_requests_total%s %d' % (prefix, _labels(endpoint=endpoint, method=method,
+                                                                      status=status), value))
+        lines += ['# HELP %s_request_duration_seconds Длительность запросов к API iiko.' % prefix,
+                  '# TYPE %s_request_duration_seconds histogram' % prefix]
+        for (endpoint, method), histogram in sorted(metrics._durations.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append('%s_request_duration_seconds_bucket%s %d' % (
+                    prefix, _labels(endpoint=endpoint, method=method, le=repr(float(bound))), count))
+            lines.append('%s_request_duration_seconds_bucket%s %d' % (
+                prefix, _labels(endpoint=endpoint, method=method, le='+Inf'), histogram.count))
+            lines.append('%s_request_duration_seconds_sum%s %r' % (
+                prefix, _labels(endpoint=endpoint, method=method), histogram.sum))
+            lines.append('%s_request_duration_seconds_count%s %d' % (
+                prefix, _labels(endpoint=endpoint, method=method), histogram.count))
+        for name, help, values in (('response_bytes_total', 'Объем ответов в байтах, переданных по сети (до распаковки).',
+                                    metrics._bytes),
+                                   ('retries_total', 'Количество повторных попыток запросов.', metrics._retries),
+                                   ('timeouts_total', 'Количество запросов, завершившихся таймаутом.',
+                                    metrics._timeouts)):
+            lines += ['# HELP %s_%s %s' % (prefix, name, help), '# TYPE %s_%s counter' % (prefix, name)]
+            for (endpoint, method), value in sorted(values.items()):
+                lines.append('%s_%s%s %d' % (prefix, name, _labels(endpoint=endpoint, method=method), value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Компактные типизированные модели справочников
+
+Записи хранятся в :class:`RecordBatch` по столбцам: для каждого поля — один список значений,
+а не словарь на каждую запись. Значения из XML хранятся строками и преобразуются (в bool,
+число) при первом обращении к полю, после чего преобразованное значение сохраняется::
+
+    products = load_products(iiko)
+    products.value(product_id, 'name')      # поиск без создания объектов
+    product = products.get(product_id)      # легкое представление записи
+    product.defaultSalePrice
+    [p.name for p in products.find('parent', group_id)]
+
+Представление записи (:class:`Model`) содержит только ссылку на пакет и номер строки.
+"""
+import sys
+
+from .xmlstream import iter_records
+
+
+def boolean(value):
+    return value == 'true' if isinstance(value, str) else bool(value)
+
+
+def number(value):
+    return float(value) if isinstance(value, str) else value
+
+
+class Field(object):
+    """Поле модели
+
+    :param name: имя атрибута.
+    :param decode: (optional) функция, преобразующая исходное значение при первом обращении.
+    :param source: (optional) имя тега XML или ключа JSON, если отличается от name.
+    :param shared: значения часто повторяются (тип, родитель) — хранить одну копию строки.
+    :param many: тег повторяется в записи; значение — кортеж строк.
+    """
+    __slots__ = ('name', 'decode', 'source', 'shared', 'many')
+
+    def __init__(self, name, decode=None, source=None, shared=False, many=False):
+        self.name = name
+        self.decode = decode
+        self.source = source or name
+        self.shared = shared
+        self.many = many
+
+
+def _field_property(position):
+    def get(self):
+        return self._batch._value(position, self._row)
+    return property(get)
+
+
+class Model(object):
+    """Представление одной записи пакета; атрибуты модели — поля из :attr:`fields`"""
+    __slots__ = ('_batch', '_row')
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for position, field in enumerate(cls.fields):
+            setattr(cls, field.name, _field_property(position))
+
+    def __init__(self, batch, row):
+        self._batch = batch
+        self._row = row
+
+    def to_dict(self):
+        return {field.name: getattr(self, field.name) for field in self.fields}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._batch is self._batch and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._batch), self._row))
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, getattr(self, 'name', self._row))
+
+
+class RecordBatch(object):
+    """Записи одной модели, хранящиеся по столбцам
+
+    :param model: подкласс :class:`Model`.
+    :param columns: списки значений в порядке model.fields.
+    """
+
+    def __init__(self, model, columns):
+        self.model = model
+        self._columns = columns
+        self._decoded = [bytearray(len(columns[0]) if columns else 0) if field.decode else None
+                         for field in model.fields]
+        self._positions = {field.name: position for position, field in enumerate(model.fields)}
+        self._indexes = {}
+
+    @classmethod
+    def from_elements(cls, model, elements):
+        """Пакет из XML-элементов записей, например из :meth:`IikoServer.iter_records`"""
+        fields = model.fields
+        columns = [[] for _ in fields]
+        intern = sys.intern
+        for element in elements:
+            values = {}
+            for child in element:
+                if len(child):
+                    continue
+                text = child.text
+                if text is not None:
+                    values.setdefault(child.tag, []).append(text)
+            for field, column in zip(fields, columns):
+                texts = values.get(field.source)
+                if field.many:
+                    column.append(tuple(intern(text) for text in texts) if texts else ())
+                elif texts:
+                    column.append(intern(texts[0]) if field.shared else texts[0])
+                else:
+                    column.append(None)
+        return cls(model, columns)
+
+    @classmethod
+    def from_xml(cls, model, content, tag):
+        """Пакет из тела XML-ответа (bytes или итерируемые куски)"""
+        chunks = [content] if isinstance(content, (bytes, str)) else content
+        return cls.from_elements(model, iter_records(chunks, tag))
+
+    @classmethod
+    def from_items(cls, model, items):
+        """Пакет из списка словарей (JSON-ответа); ключи вне model.fields отбрасываются"""
+        fields = model.fields
+        columns = [[] for _ in fields]
+        intern = sys.intern
+        for item in items:
+            for field, column in zip(fields, columns):
+                value = item.get(field.source)
+                column.append(intern(value) if field.shared and isinstance(value, str) else value)
+        return cls(model, columns)
+
+    def __len__(self):
+        return len(self._columns[0]) if self._columns else 0
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.model(self, row)
+
+    def __iter__(self):
+        model = self.model
+        for row in range(len(self)):
+            yield model(self, row)
+
+    def _value(self, position, row):
+        decoded = self._decoded[position]
+        column = self._columns[position]
+        if decoded is not None and not decoded[row]:
+            value = column[row]
+            if value is not None:
+                column[row] = self.model.fields[position].decode(value)
+            decoded[row] = 1
+        return column[row]
+
+    def column(self, name):
+        """Все значения поля в порядке записей"""
+        position = self._positions[name]
+        return [self._value(position, row) for row in range(len(self))]
+
+    def index(self, name):
+        """Индекс значение поля -> номер первой записи; строится при первом обращении"""
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            for row, value in enumerate(self.column(name)):
+                index.setdefault(value, row)
+            self._indexes[name] = index
+        return index
+
+    def row(self, id):
+        """Номер записи по id или None"""
+        return self.index('id').get(id)
+
+    def get(self, id):
+        """Запись по id или None"""
+        row = self.row(id)
+        return None if row is None else self.model(self, row)
+
+    def value(self, id, name, default=None):
+        """Значение поля записи по id без создания объекта записи"""
+        row = self.index('id').get(id)
+        if row is None:
+            return default
+        return self._value(self._positions[name], row)
+
+    def find(self, name, value):
+        """Записи, у которых поле равно value"""
+        position = self._positions[name]
+        model = self.model
+        return [model(self, row) for row in range(len(self)) if self._value(position, row) == value]
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+
+class Department(Model):
+    """Подразделение (corporateItemDto)"""
+    __slots__ = ()
+    fields = (Field('id'), Field('parentId', shared=True), Field('code'), Field('name'),
+              Field('type', shared=True), Field('taxpayerIdNumber'))
+
+
+class Employee(Model):
+    """Сотрудник"""
+    __slots__ = ()
+    fields = (Field('id'), Field('code'), Field('name'), Field('login'), Field('firstName'), Field('middleName'),
+              Field('lastName'), Field('mainRoleId', shared=True), Field('mainRoleCode', shared=True),
+              Field('roleCodes', many=True), Field('departmentCodes', many=True),
+              Field('preferredDepartmentCode', shared=True), Field('phone'), Field('cellPhone'), Field('email'),
+              Field('taxpayerIdNumber'), Field('deleted', boolean), Field('supplier', boolean),
+              Field('employee', boolean), Field('client', boolean))
+
+
+class Supplier(Model):
+    """Поставщик"""
+    __slots__ = ()
+    fields = (Field('id'), Field('code'), Field('name'), Field('cardNumber'), Field('taxpayerIdNumber'),
+              Field('phone'), Field('email'), Field('address'), Field('note'), Field('deleted', boolean),
+              Field('supplier', boolean), Field('employee', boolean), Field('client', boolean))
+
+
+class Product(Model):
+    """Элемент номенклатуры (products2)"""
+    __slots__ = ()
+    fields = (Field('id'), Field('num'), Field('code'), Field('name'), Field('parent', shared=True),
+              Field('type', shared=True), Field('mainUnit', shared=True), Field('category', shared=True),
+              Field('accountingCategory', shared=True), Field('taxCategory', shared=True),
+              Field('defaultSalePrice', number), Field('unitWeight', number), Field('deleted', boolean))
+
+
+def load_departments(server, **params):
+    """Подразделения сервера; ответ разбирается потоково"""
+    return RecordBatch.from_elements(Department, server.iter_records(
+        'api/corporation/departments', 'corporateItemDto', params))
+
+
+def load_employees(server, **params):
+    return RecordBatch.from_elements(Employee, server.iter_records('api/corporation/employees', 'employee', params))
+
+
+def load_suppliers(server, **params):
+    return RecordBatch.from_elements(Supplier, server.iter_records('api/suppliers', 'employee', params))
+
+
+def load_products(server, **params):
+    """Номенклатура сервера (products2)"""
+    response = server.products2(**params)
+    response.raise_for_status()
+    return RecordBatch.from_items(Product, response.json())
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Кэш номенклатуры iikoBiz по организациям
+
+``nomenclature(organizationId)`` каждый раз отдает меню целиком — для больших меню это
+мегабайты JSON. :class:`NomenclatureCache` хранит одну разобранную копию меню на организацию,
+общую для всех потоков, и обновляет ее не чаще раза в ttl секунд. Если revision в ответе не
+изменилась, ответ не разбирается и остается прежняя копия::
+
+    menus = NomenclatureCache(biz, ttl=60)
+    menu = menus.get(org_id)
+    menu.revision
+    menu.product(product_id)['price']
+    menu.modifier(modifier_id)['name']
+    menu.modifiers_of(product_id)
+"""
+import asyncio
+import re
+import threading
+import time
+
+DEFAULT_TTL = 60
+
+_REVISION = re.compile(rb'"revision"\s*:\s*(-?\d+)')
+
+
+def revision(content):
+    """revision из тела ответа без разбора JSON; None, если ее не удалось однозначно найти"""
+    found = _REVISION.findall(content)
+    return int(found[0]) if len(found) == 1 else None
+
+
+class Menu(object):
+    """Разобранная номенклатура организации с индексами по id
+
+    Объект не изменяется после создания, поэтому его можно читать из нескольких потоков.
+
+    :attr revision: ревизия номенклатуры.
+    :attr data: ответ сервера целиком.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.revision = data.get('revision')
+        self.groups = {group['id']: group for group in data.get('groups') or ()}
+        self.products = {product['id']: product for product in data.get('products') or ()}
+        self.modifiers = {id: product for id, product in self.products.items()
+                          if product.get('type') == 'modifier'}
+
+    def __repr__(self):
+        return '<Menu revision=%s products=%s>' % (self.revision, len(self.products))
+
+    def product(self, id):
+        """Товар, блюдо или модификатор по id; None, если его нет"""
+        return self.products.get(id)
+
+    def group(self, id):
+        return self.groups.get(id)
+
+    def modifier(self, id):
+        """Модификатор (товар с type=modifier) по id"""
+        return self.modifiers.get(id)
+
+    def modifiers_of(self, id):
+        """Модификаторы блюда: одиночные и из групп модификаторов"""
+        product = self.products.get(id)
+        if product is None:
+            return []
+        ids = [modifier['modifierId'] for modifier in product.get('modifiers') or ()]
+        for group in product.get('groupModifiers') or ():
+            ids.extend(modifier['modifierId'] for modifier in group.get('childModifiers') or ())
+        return [self.products[id] for id in ids if id in self.products]
+
+
+class _Entry(object):
+    __slots__ = ('menu', 'loaded')
+
+    def __init__(self, menu, loaded):
+        self.menu = menu
+        self.loaded = loaded
+
+
+class NomenclatureCache(object):
+    """Номенклатура по организациям с обновлением по ревизии
+
+    :param biz: IikoBiz или AsyncIikoBiz.
+    :param ttl: сколько секунд копия считается свежей и возвращается без запроса к серверу.
+    """
+
+    def __init__(self, biz, ttl=DEFAULT_TTL):
+        self.biz = biz
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._async_locks = {}
+
+    def _fresh(self, organization):
+        entry = self._entries.get(organization)
+        if entry is not None and time.monotonic() - entry.loaded < self.ttl:
+            return entry.menu
+        return None
+
+    def _update(self, organization, response):
+        response.raise_for_status()
+        entry = self._entries.get(organization)
+        current = revision(response.content)
+        if entry is not None and current is not None and current == entry.menu.revision:
+            menu = entry.menu
+        else:
+            menu = Menu(response.json())
+        self._entries[organization] = _Entry(menu, time.monotonic())
+        return menu
+
+    def get(self, organization, **params):
+        """Номенклатура организации
+
+        Одновременные запросы одной организации из разных потоков ждут одну загрузку.
+
+        :returns: :class:`Menu`.
+        """
+        menu = self._fresh(organization)
+        if menu is not None:
+            return menu
+        with self._lock:
+            lock = self._locks.setdefault(organization, threading.Lock())
+        with lock:
+            menu = self._fresh(organization)
+            if menu is not None:
+                return menu
+            return self._update(organization, self.biz.nomenclature(organization, **params))
+
+    async def async_get(self, organization, **params):
+        menu = self._fresh(organization)
+        if menu is not None:
+            return menu
+        lock = self._async_locks.setdefault(organization, asyncio.Lock())
+        async with lock:
+            menu = self._fresh(organization)
+            if menu is not None:
+                return menu
+            return self._update(organization, await self.biz.nomenclature(organization, **params))
+
+    def invalidate(self, organization=None):
+        """Помечает копию организации (или все копии) устаревшей; ревизия сохраняется для сравнения"""
+        entries = [self._entries.get(organization)] if organization is not None else list(self._entries.values())
+        for entry in entries:
+            if entry is not None:
+                entry.loaded = float('-inf')
+
+    def clear(self):
+        self._entries.clear()
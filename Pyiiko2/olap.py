@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Выполнение OLAP-отчетов (api/v2/reports/olap) по частям
+
+Длинный период делится на окна по дням, неделям или месяцам, окна запрашиваются параллельно,
+а строки ответов снова сводятся в одну таблицу::
+
+    request = {
+        "reportType": "SALES",
+        "groupByRowFields": ["DishName"],
+        "aggregateFields": ["DishDiscountSumInt", "DishAmountInt"],
+        "filters": {
+            "OpenDate.Typed": {"filterType": "DateRange", "periodType": "CUSTOM",
+                               "from": "2020-01-01", "to": "2021-01-01",
+                               "includeLow": True, "includeHigh": False}
+        }
+    }
+    report = olap2_sharded(iiko, request, window='month', max_workers=4)
+    report['data']
+
+.. note::
+
+    При сведении значения полей агрегации с одинаковыми группировками складываются. Суммы и
+    количества сводятся корректно; средние и проценты по окнам сложить нельзя, их следует
+    считать из сумм после сведения либо добавить поле даты в группировку.
+"""
+import calendar
+import copy
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import IikoError
+from .retry import RetryPolicy
+from .session import _retry_after
+
+WINDOWS = ('day', 'week', 'month')
+DEFAULT_WINDOW = 'month'
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = RetryPolicy(retries=DEFAULT_RETRIES, backoff=1.0)
+
+_MERGE = {
+    'sum': lambda a, b: (a or 0) + (b or 0),
+    'min': lambda a, b: b if a is None else a if b is None else min(a, b),
+    'max': lambda a, b: b if a is None else a if b is None else max(a, b),
+    'first': lambda a, b: b if a is None else a,
+}
+
+
+class OlapShardError(Exception):
+    """Окно отчета не удалось получить после всех повторов"""
+
+    def __init__(self, date_from, date_to, reason):
+        super().__init__('OLAP %s - %s: %s' % (date_from, date_to, reason))
+        self.date_from = date_from
+        self.date_to = date_to
+        self.reason = reason
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _next_window(start, window):
+    if window == 'day':
+        return start + datetime.timedelta(days=1)
+    if window == 'week':
+        return start + datetime.timedelta(days=7 - start.weekday())
+    if window == 'month':
+        return start + datetime.timedelta(days=calendar.monthrange(start.year, start.month)[1] - start.day + 1)
+    raise ValueError('Неизвестное окно %r, допустимы %s' % (window, ', '.join(WINDOWS)))
+
+
+def split_period(date_from, date_to, window=DEFAULT_WINDOW):
+    """Делит полуинтервал [date_from, date_to) на окна
+
+    Окна выравниваются по началу недели (понедельник) или месяца.
+
+    :returns: список пар (начало, конец) — конец не входит в окно.
+    """
+    windows = []
+    start = date_from
+    while start < date_to:
+        end = min(_next_window(start, window), date_to)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
+def date_filter(request):
+    """Возвращает (имя поля, фильтр) первого фильтра по периоду в запросе"""
+    for field, value in (request.get('filters') or {}).items():
+        if isinstance(value, dict) and value.get('filterType') == 'DateRange':
+            return field, value
+    raise ValueError('В запросе нет фильтра DateRange')
+
+
+def request_period(request, date_field=None):
+    """Период запроса в виде полуинтервала дат [начало, конец)"""
+    if date_field is None:
+        date_field, period = date_filter(request)
+    else:
+        period = request['filters'][date_field]
+    date_from = _parse_date(period['from'])
+    if not period.get('includeLow', True):
+        date_from += datetime.timedelta(days=1)
+    date_to = _parse_date(period['to'])
+    if period.get('includeHigh', False):
+        date_to += datetime.timedelta(days=1)
+    return date_field, date_from, date_to
+
+
+def with_period(request, date_field, date_from, date_to):
+    """Копия запроса с периодом [date_from, date_to)"""
+    request = copy.deepcopy(request)
+    request['filters'][date_field] = dict(request['filters'][date_field], periodType='CUSTOM',
+                                          **{'from': date_from.isoformat(), 'to': date_to.isoformat(),
+                                             'includeLow': True, 'includeHigh': False})
+    return request
+
+
+def shard_request(request, window=DEFAULT_WINDOW, date_field=None):
+    """Делит запрос на запросы по окнам
+
+    :returns: список кортежей (начало, конец, запрос).
+    """
+    date_field, date_from, date_to = request_period(request, date_field)
+    return [(start, end, with_period(request, date_field, start, end))
+            for start, end in split_period(date_from, date_to, window)]
+
+
+def group_fields(request):
+    return list(request.get('groupByRowFields') or []) + list(request.get('groupByColFields') or [])
+
+
+def merge_rows(chunks, groups, aggregates, merge=None):
+    """Сводит строки нескольких ответов по полям группировки
+
+    :param chunks: итерируемые списки строк (словарей) ответов.
+    :param groups: поля группировки.
+    :param aggregates: поля агрегации.
+    :param merge: (optional) способ сведения поля агрегации: ``sum`` (по умолчанию), ``min``, ``max``, ``first``.
+    """
+    merge = merge or {}
+    functions = [(field, _MERGE[merge.get(field, 'sum')]) for field in aggregates]
+    rows = {}
+    for chunk in chunks:
+        for row in chunk:
+            key = tuple(row.get(field) for field in groups)
+            current = rows.get(key)
+            if current is None:
+                rows[key] = dict(row)
+                continue
+            for field, function in functions:
+                current[field] = function(current.get(field), row.get(field))
+    return list(rows.values())
+
+
+def fetch_shard(server, request, date_from, date_to, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Запрашивает одно окно, повторяя запрос при ошибке
+
+    :param backoff: :class:`~Pyiiko2.retry.RetryPolicy`, чья пауза (экспоненциальная со случайным \
+    разбросом) выдерживается перед повтором; Retry-After сервера продлевает паузу.
+    :returns: строки ответа (data).
+    """
+    reason = None
+    retry_after = 0
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(max(backoff.delay(attempt - 1), retry_after))
+        retry_after = 0
+        try:
+            response = server.olap2(json=request)
+        except IikoError as e:
+            reason = e
+            continue
+        if response.status_code != 200:
+            reason = '%s %s' % (response.status_code, response.text[:200])
+            retry_after = _retry_after(response)
+        else:
+            return response.json().get('data', [])
+    raise OlapShardError(date_from, date_to, reason)
+
+
+def olap2_sharded(server, request, window=DEFAULT_WINDOW, max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                  date_field=None, merge=None, backoff=DEFAULT_BACKOFF):
+    """Выполняет OLAP-отчет по окнам периода параллельно и сводит результат
+
+    :param server: IikoServer.
+    :param request: тело запроса olap2 с фильтром DateRange.
+    :param window: ``day``, ``week`` или ``month``.
+    :param max_workers: максимальное количество одновременно выполняемых окон.
+    :param retries: сколько раз повторять окно, завершившееся ошибкой. Повторяются только такие окна.
+    :param date_field: (optional) поле фильтра периода; по умолчанию первый фильтр DateRange.
+    :param merge: (optional) способы сведения полей агрегации, см. :func:`merge_rows`.
+    :param backoff: :class:`~Pyiiko2.retry.RetryPolicy` с паузой между повторами окна.
+
+    :returns: словарь ``{'data': [...], 'summary': []}`` в формате ответа olap2.
+    """
+    shards = shard_request(request, window, date_field)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_shard, server, shard, start, end, retries, backoff) for start, end, shard in shards]
+        chunks = [future.result() for future in futures]
+    data = merge_rows(chunks, group_fields(request), request.get('aggregateFields') or [], merge)
+    return {'data': data, 'summary': []}
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Кэш OLAP-отчетов по дням
+
+Результат olap2 хранится отдельно за каждый день периода. Закрытые дни больше не меняются,
+поэтому повторный запрос берет их из кэша и запрашивает у сервера только открытые дни
+(по умолчанию сегодня и вчера) и дни, которых еще нет в кэше::
+
+    cache = OlapCache('/var/cache/pyiiko/olap.sqlite')
+    report = cache.olap2(iiko, request)
+    report['data']
+
+Строки разных дней сводятся так же, как в :func:`Pyiiko2.olap.olap2_sharded`.
+"""
+import copy
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .olap import (request_period, with_period, split_period, fetch_shard, merge_rows, group_fields,
+                   DEFAULT_WORKERS, DEFAULT_RETRIES, DEFAULT_BACKOFF)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_OPEN_DAYS = 2
+
+
+def normalize_request(request, date_field):
+    """Запрос без периода, с упорядоченными полями — одинаковые отчеты дают одинаковый ключ"""
+    request = copy.deepcopy(request)
+    for field in ('groupByRowFields', 'groupByColFields', 'aggregateFields'):
+        if request.get(field):
+            request[field] = sorted(request[field])
+    filters = request.get('filters') or {}
+    filters[date_field] = {'filterType': 'DateRange'}
+    for value in filters.values():
+        if isinstance(value, dict) and isinstance(value.get('values'), list):
+            value['values'] = sorted(value['values'], key=str)
+    return request
+
+
+class OlapCache(object):
+    """Постоянный кэш olap2 с разбиением по дням
+
+    :param path: путь к файлу SQLite.
+    :param max_bytes: предельный размер сохраненных данных; при превышении вытесняются дни, \
+    к которым дольше всего не обращались.
+    :param open_days: сколько последних дней, включая сегодняшний, считаются открытыми.
+    :param is_closed: (optional) функция day -> bool, переопределяющая правило open_days, \
+    например по списку закрытых кассовых смен.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, open_days=DEFAULT_OPEN_DAYS, is_closed=None):
+        self.max_bytes = max_bytes
+        self.open_days = open_days
+        self._is_closed = is_closed
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS olap_day ('
+                         'key TEXT, server TEXT, day TEXT, rows BLOB, size INTEGER, accessed REAL, '
+                         'PRIMARY KEY (key, day))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS olap_day_accessed ON olap_day (accessed)')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def is_closed(self, day):
+        if self._is_closed is not None:
+            return self._is_closed(day)
+        return day <= datetime.date.today() - datetime.timedelta(days=self.open_days)
+
+    def key(self, server, request, date_field):
+        normalized = json.dumps([server.address, date_field, normalize_request(request, date_field)],
+                                sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def _load(self, key, days):
+        with self._lock:
+            rows = self._db.execute('SELECT day, rows FROM olap_day WHERE key = ? AND day >= ? AND day <= ?',
+                                    (key, days[0].isoformat(), days[-1].isoformat())).fetchall()
+            if rows:
+                self._db.execute('UPDATE olap_day SET accessed = ? WHERE key = ? AND day >= ? AND day <= ?',
+                                 (time.time(), key, days[0].isoformat(), days[-1].isoformat()))
+                self._db.commit()
+        return {datetime.date.fromisoformat(day): json.loads(zlib.decompress(blob)) for day, blob in rows}
+
+    def _store(self, key, server, partitions):
+        now = time.time()
+        with self._lock:
+            for day, rows in partitions.items():
+                blob = zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+                self._db.execute('INSERT OR REPLACE INTO olap_day VALUES (?, ?, ?, ?, ?, ?)',
+                                 (key, server.address, day.isoformat(), blob, len(blob), now))
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM olap_day').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, day, size in self._db.execute('SELECT key, day, size FROM olap_day ORDER BY accessed').fetchall():
+            self._db.execute('DELETE FROM olap_day WHERE key = ? AND day = ?', (key, day))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+
+    def size(self):
+        """Размер сохраненных данных в байтах"""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM olap_day').fetchone()[0]
+
+    def invalidate(self, server=None, request=None, date_from=None, date_to=None):
+        """Удаляет сохраненные дни
+
+        Без аргументов очищает весь кэш. Можно ограничить сервером, отчетом и/или периодом \
+        [date_from, date_to] включительно. Отчет хранится отдельно для каждого сервера, поэтому \
+        request задается только вместе с server.
+
+        :raises ValueError: request задан без server.
+        """
+        where, args = [], []
+        if request is not None:
+            if server is None:
+                raise ValueError('Для удаления отчета по request нужно указать server')
+            date_field = request_period(request)[0]
+            where.append('key = ?')
+            args.append(self.key(server, request, date_field))
+        elif server is not None:
+            where.append('server = ?')
+            args.append(server.address)
+        if date_from is not None:
+            where.append('day >= ?')
+            args.append(date_from.isoformat())
+        if date_to is not None:
+            where.append('day <= ?')
+            args.append(date_to.isoformat())
+        with self._lock:
+            self._db.execute('DELETE FROM olap_day' + (' WHERE ' + ' AND '.join(where) if where else ''), args)
+            self._db.commit()
+
+    def olap2(self, server, request, max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, date_field=None,
+              merge=None, backoff=DEFAULT_BACKOFF):
+        """Выполняет olap2, запрашивая у сервера только открытые и отсутствующие в кэше дни
+
+        Параметры совпадают с :func:`Pyiiko2.olap.olap2_sharded`.
+
+        :returns: словарь ``{'data': [...], 'summary': []}`` в формате ответа olap2.
+        """
+        date_field, date_from, date_to = request_period(request, date_field)
+        days = [start for start, end in split_period(date_from, date_to, 'day')]
+        if not days:
+            return {'data': [], 'summary': []}
+        key = self.key(server, request, date_field)
+        cached = self._load(key, days)
+        missing = [day for day in days if day not in cached or not self.is_closed(day)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch_shard, server,
+                                       with_period(request, date_field, day, day + datetime.timedelta(days=1)),
+                                       day, day + datetime.timedelta(days=1), retries, backoff)
+                       for day in missing]
+            fetched = dict(zip(missing, [future.result() for future in futures]))
+        self._store(key, server, {day: rows for day, rows in fetched.items() if self.is_closed(day)})
+        chunks = [fetched[day] if day in fetched else cached[day] for day in days]
+        data = merge_rows(chunks, group_fields(request), request.get('aggregateFields') or [], merge)
+        return {'data': data, 'summary': []}
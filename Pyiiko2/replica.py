@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Локальная реплика номенклатуры iikoServerApi
+
+Номенклатура (products2), группы (product_groups2) и категории (product_categories2)
+сохраняются в SQLite. Первая синхронизация загружает справочники целиком, следующие
+сравнивают хэш каждого элемента с сохраненным и записывают только добавленные, измененные и
+удаленные элементы. Поиск выполняется локально по индексам::
+
+    replica = NomenclatureReplica(iiko, '/var/lib/pyiiko/nomenclature.sqlite')
+    replica.sync()
+    replica.product_by_num('00042')
+    replica.products_in_group(group_id, recursive=True)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+KINDS = {
+    'product': 'products2',
+    'group': 'product_groups2',
+    'category': 'product_categories2',
+}
+
+
+def item_hash(item):
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class NomenclatureReplica(object):
+    """Реплика номенклатуры одного сервера
+
+    :param server: IikoServer.
+    :param path: путь к файлу SQLite; ``:memory:`` — реплика только в памяти.
+    :param include_deleted: хранить удаленные элементы (с флагом deleted).
+    """
+
+    def __init__(self, server, path, include_deleted=False):
+        self.server = server
+        self.include_deleted = include_deleted
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS item (
+                kind TEXT, id TEXT, num TEXT, code TEXT, parent TEXT, name TEXT, deleted INTEGER,
+                hash TEXT, data TEXT, PRIMARY KEY (kind, id));
+            CREATE INDEX IF NOT EXISTS item_num ON item (kind, num);
+            CREATE INDEX IF NOT EXISTS item_code ON item (kind, code);
+            CREATE INDEX IF NOT EXISTS item_parent ON item (kind, parent);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    @property
+    def synced_at(self):
+        """Время последней синхронизации (timestamp) или None"""
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def _download(self, kind):
+        params = {'includeDeleted': 'true'} if self.include_deleted else {}
+        response = getattr(self.server, KINDS[kind])(**params)
+        response.raise_for_status()
+        return response.json()
+
+    def sync(self):
+        """Синхронизирует реплику с сервером
+
+        :returns: словарь ``{вид: {'added': n, 'changed': n, 'deleted': n}}``.
+        """
+        downloaded = {kind: self._download(kind) for kind in KINDS}
+        stats = {}
+        with self._lock:
+            for kind, items in downloaded.items():
+                stats[kind] = self._apply(kind, items)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('synced_at', ?)", (str(time.time()),))
+            self._db.commit()
+        return stats
+
+    def _apply(self, kind, items):
+        stored = dict(self._db.execute('SELECT id, hash FROM item WHERE kind = ?', (kind,)))
+        added = changed = 0
+        rows = []
+        for item in items:
+            digest = item_hash(item)
+            previous = stored.pop(item['id'], None)
+            if previous == digest:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                changed += 1
+            rows.append((kind, item['id'], item.get('num'), item.get('code'), item.get('parent'), item.get('name'),
+                         int(bool(item.get('deleted'))), digest, json.dumps(item, ensure_ascii=False)))
+        self._db.executemany('INSERT OR REPLACE INTO item VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self._db.executemany('DELETE FROM item WHERE kind = ? AND id = ?', [(kind, id) for id in stored])
+        return {'added': added, 'changed': changed, 'deleted': len(stored)}
+
+    def _one(self, where, args):
+        row = self._db.execute('SELECT data FROM item WHERE ' + where + ' LIMIT 1', args).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _many(self, where, args):
+        return [json.loads(data) for data, in self._db.execute('SELECT data FROM item WHERE ' + where, args)]
+
+    def product(self, id):
+        return self._one('kind = ? AND id = ?', ('product', id))
+
+    def product_by_num(self, num):
+        """Элемент номенклатуры по артикулу"""
+        return self._one('kind = ? AND num = ?', ('product', num))
+
+    def products_by_code(self, code):
+        """Элементы номенклатуры по коду быстрого набора"""
+        return self._many('kind = ? AND code = ?', ('product', code))
+
+    def products_in_group(self, group_id, recursive=False):
+        """Элементы номенклатуры группы; recursive — включая вложенные группы"""
+        groups = [group_id]
+        if recursive:
+            groups = self._subgroups(group_id)
+        placeholders = ', '.join('?' * len(groups))
+        return self._many('kind = ? AND parent IN (%s)' % placeholders, ['product'] + groups)
+
+    def _subgroups(self, group_id):
+        groups, pending = [group_id], [group_id]
+        while pending:
+            parent = pending.pop()
+            children = [id for id, in self._db.execute('SELECT id FROM item WHERE kind = ? AND parent = ?',
+                                                        ('group', parent))]
+            groups.extend(children)
+            pending.extend(children)
+        return groups
+
+    def products(self):
+        return self._many('kind = ?', ('product',))
+
+    def group(self, id):
+        return self._one('kind = ? AND id = ?', ('group', id))
+
+    def groups(self, parent=None):
+        if parent is None:
+            return self._many('kind = ?', ('group',))
+        return self._many('kind = ? AND parent = ?', ('group', parent))
+
+    def category(self, id):
+        return self._one('kind = ? AND id = ?', ('category', id))
+
+    def categories(self):
+        return self._many('kind = ?', ('category',))
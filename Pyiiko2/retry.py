@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Повторы запросов, размыкатель цепи и дублирующие запросы
+
+:class:`RetryPolicy` повторяет идемпотентные запросы (по умолчанию только GET) после ошибок
+соединения, таймаутов и ответов 429/502/503/504 с экспоненциальной паузой со случайным
+разбросом. :class:`CircuitBreaker` после ``failure_threshold`` ошибок подряд перестает
+отправлять запросы на ``reset_timeout`` секунд и сразу выбрасывает
+:class:`~Pyiiko2.exceptions.CircuitOpenError`, затем пропускает один пробный запрос::
+
+    iiko = IikoServer(ip=ip, port=port, login=login, passhash=passhash,
+                      retry=RetryPolicy(retries=3), breaker=CircuitBreaker.for_host(ip, port))
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RetryPolicy(object):
+    """Правила повтора запросов
+
+    :param retries: сколько раз повторять запрос.
+    :param backoff: базовая пауза в секундах, удваивается с каждой попыткой.
+    :param max_backoff: верхняя граница паузы.
+    :param jitter: выбирать паузу случайно от 0 до расчетной (full jitter).
+    :param statuses: коды ответа, после которых запрос повторяется.
+    :param methods: методы, которые можно повторять.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, jitter=True,
+                 statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+        self.methods = methods
+
+    def can_retry(self, method, attempt):
+        return method.upper() in self.methods and attempt < self.retries
+
+    def delay(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class CircuitBreaker(object):
+    """Размыкатель цепи для одного сервера
+
+    :param failure_threshold: количество ошибок подряд, после которого цепь размыкается.
+    :param reset_timeout: через сколько секунд пропустить пробный запрос.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_host(cls, ip, port=None, **kwargs):
+        """Общий размыкатель для всех клиентов одного сервера"""
+        key = '%s:%s' % (ip, port or 80)
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(**kwargs)
+            return cls._registry[key]
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Можно ли отправить запрос; в полуоткрытом состоянии пропускается один пробный"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed):
+        with self._lock:
+            self._probing = False
+            if not failed:
+                self._failures = 0
+                self._opened = None
+                return
+            self._failures += 1
+            if self._opened is not None or self._failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+
+
+def _discard(future):
+    """Закрывает результат проигравшей попытки: ответ с stream=True держит соединение пула"""
+    if not future.cancelled() and future.exception() is None:
+        close = getattr(future.result(), 'close', None)
+        if close is not None:
+            close()
+
+
+def hedged(call, delay):
+    """Выполняет call и, если ответа нет через delay секунд, параллельно повторяет его
+
+    Возвращается первый успешный результат; исключение выбрасывается, только если обе попытки \
+    завершились ошибкой. Результат другой попытки закрывается, когда она завершится.
+    """
+    executor = ThreadPoolExecutor(max_workers=2)
+    futures = {executor.submit(call)}
+    winner = None
+    try:
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures.add(executor.submit(call))
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        for future in futures:
+            if future is not winner:
+                future.add_done_callback(_discard)
+        executor.shutdown(wait=False)
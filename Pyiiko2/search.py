@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Локальный поиск по номенклатуре, поставщикам, складам и подразделениям
+
+Вместо products_find, suppliers_find, stores_find и departments_find, которые на каждый
+поиск отправляют регулярное выражение серверу, справочник загружается один раз и ищется в
+памяти. Поиск по id, артикулу и коду идет по хэш-таблицам, по названиям — по триграммному
+индексу, после которого кандидаты проверяются тем же правилом, что и на сервере::
+
+    index = products_index(iiko)
+    index.get(product_id)
+    index.lookup('num', '00042')
+    index.find(name='Борщ')                                  # регулярное выражение, с учетом регистра
+    index.find(name='борщ', mode='substring', case_sensitive=False)
+    index.update(iiko.products2().json())                    # пересчитываются только изменения
+"""
+import re
+from io import StringIO
+
+from defusedxml.ElementTree import parse
+
+from .replica import item_hash
+from .xmlstream import element_to_dict
+
+try:
+    import re._parser as _sre_parse
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+MODES = ('regex', 'substring', 'exact')
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _required_literals(pattern):
+    """Строки, которые обязаны входить в любое совпадение регулярного выражения"""
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except re.error:
+        return []
+    literal = _sre_parse.LITERAL
+    runs, run = [], []
+    for op, value in parsed:
+        if op is literal:
+            run.append(chr(value))
+            continue
+        if run:
+            runs.append(''.join(run))
+        run = []
+    if run:
+        runs.append(''.join(run))
+    return runs
+
+
+class SearchIndex(object):
+    """Индекс записей справочника
+
+    :param key: поле-идентификатор записи.
+    :param keys: поля с поиском по точному значению (хэш-таблицы).
+    :param text: поля с триграммным индексом для поиска по регулярному выражению и подстроке.
+    """
+
+    def __init__(self, key='id', keys=('num', 'code'), text=('name', 'code', 'num')):
+        self.key = key
+        self.keys = tuple(keys)
+        self.text = tuple(text)
+        self._records = {}
+        self._order = {}
+        self._sequence = 0
+        self._hashes = {}
+        self._values = {field: {} for field in self.keys}
+        self._grams = {field: {} for field in self.text}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, id):
+        return id in self._records
+
+    def update(self, records, complete=True):
+        """Обновляет индекс, пересчитывая только добавленные, измененные и удаленные записи
+
+        :param records: записи справочника (словари).
+        :param complete: records — справочник целиком; отсутствующие в нем записи удаляются.
+        :returns: словарь ``{'added': n, 'changed': n, 'deleted': n}``.
+        """
+        added = changed = 0
+        missing = set(self._records) if complete else set()
+        for record in records:
+            id = record[self.key]
+            missing.discard(id)
+            digest = item_hash(record)
+            previous = self._hashes.get(id)
+            if previous == digest:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                changed += 1
+                self._remove(id)
+            self._add(id, record, digest)
+        for id in missing:
+            self._remove(id)
+        return {'added': added, 'changed': changed, 'deleted': len(missing)}
+
+    def _add(self, id, record, digest):
+        self._records[id] = record
+        self._sequence += 1
+        self._order[id] = self._sequence
+        self._hashes[id] = digest
+        for field in self.keys:
+            value = record.get(field)
+            if value is not None:
+                self._values[field].setdefault(value, []).append(id)
+        for field in self.text:
+            value = record.get(field)
+            if value:
+                postings = self._grams[field]
+                for gram in trigrams(str(value)):
+                    postings.setdefault(gram, set()).add(id)
+
+    def _remove(self, id):
+        record = self._records.pop(id)
+        del self._order[id]
+        del self._hashes[id]
+        for field in self.keys:
+            value = record.get(field)
+            ids = self._values[field].get(value)
+            if ids is not None:
+                ids.remove(id)
+                if not ids:
+                    del self._values[field][value]
+        for field in self.text:
+            value = record.get(field)
+            if value:
+                postings = self._grams[field]
+                for gram in trigrams(str(value)):
+                    ids = postings[gram]
+                    ids.discard(id)
+                    if not ids:
+                        del postings[gram]
+
+    def get(self, id):
+        return self._records.get(id)
+
+    def lookup(self, field, value):
+        """Записи с точным значением поля из :attr:`keys`"""
+        return [self._records[id] for id in self._values[field].get(value, ())]
+
+    def _postings(self, field, literals):
+        """Списки записей по триграммам обязательных подстрок; None — у поля нет индекса"""
+        postings = self._grams.get(field)
+        if postings is None:
+            return None
+        return [postings.get(gram, ()) for literal in literals for gram in trigrams(literal)]
+
+    def _matcher(self, pattern, mode, case_sensitive):
+        if mode == 'regex':
+            regex = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+            return lambda value: regex.search(value) is not None, _required_literals(pattern)
+        if mode == 'substring':
+            if case_sensitive:
+                return lambda value: pattern in value, [pattern]
+            folded = pattern.lower()
+            return lambda value: folded in value.lower(), [pattern]
+        if mode == 'exact':
+            if case_sensitive:
+                return lambda value: value == pattern, [pattern]
+            folded = pattern.lower()
+            return lambda value: value.lower() == folded, [pattern]
+        raise ValueError('Неизвестный режим %r, допустимы %s' % (mode, ', '.join(MODES)))
+
+    def find(self, mode='regex', case_sensitive=True, include_deleted=False, **filters):
+        """Записи, у которых все поля filters подходят под заданные шаблоны
+
+        Как и поиск на сервере, по умолчанию шаблон — регулярное выражение, которое ищется в любом месте \
+        значения с учетом регистра, а удаленные записи не возвращаются.
+
+        :param mode: ``regex``, ``substring`` или ``exact``.
+        :param case_sensitive: учитывать регистр.
+        :param include_deleted: включать записи с deleted=true.
+        """
+        postings = []
+        checks = []
+        for field, pattern in filters.items():
+            match, literals = self._matcher(pattern, mode, case_sensitive)
+            checks.append((field, match))
+            postings.extend(self._postings(field, literals) or ())
+        if postings:
+            # пересечение начинается с самого короткого списка
+            postings.sort(key=len)
+            ids = set(postings[0]).intersection(*postings[1:])
+            ids = sorted(ids, key=self._order.__getitem__) if len(ids) > 1 else ids
+        else:
+            ids = self._records
+        result = []
+        for id in ids:
+            record = self._records[id]
+            if not include_deleted and record.get('deleted') in (True, 'true'):
+                continue
+            if all(record.get(field) is not None and match(str(record.get(field))) for field, match in checks):
+                result.append(record)
+        return result
+
+
+def _xml_records(response, tag):
+    response.raise_for_status()
+    return [element_to_dict(element) for element in parse(StringIO(response.text)).getroot().iter(tag)]
+
+
+def products_index(server, index=None, **params):
+    """Индекс номенклатуры (products2); с index — обновляет существующий"""
+    response = server.products2(**params)
+    response.raise_for_status()
+    index = index if index is not None else SearchIndex()
+    index.update(response.json())
+    return index
+
+
+def suppliers_index(server, index=None, **params):
+    """Индекс поставщиков (api/suppliers)"""
+    index = index if index is not None else SearchIndex(keys=('code',), text=('name', 'code'))
+    index.update(_xml_records(server.suppliers(**params), 'employee'))
+    return index
+
+
+def stores_index(server, index=None, **params):
+    """Индекс складов (api/corporation/stores)"""
+    index = index if index is not None else SearchIndex(keys=('code',), text=('name', 'code'))
+    index.update(_xml_records(server.stores(**params), 'corporateItemDto'))
+    return index
+
+
+def departments_index(server, index=None, **params):
+    """Индекс подразделений (api/corporation/departments)"""
+    index = index if index is not None else SearchIndex(keys=('code',), text=('name', 'code'))
+    index.update(_xml_records(server.departments(**params), 'corporateItemDto'))
+    return index
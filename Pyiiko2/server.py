@@ -1,25 +1,60 @@
 # -*- coding: utf-8 -*-
-import requests, hashlib
+import hashlib
+import logging
+import requests
 from defusedxml.ElementTree import parse
 from io import StringIO
+from .session import BaseClient, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE
+from .exceptions import IikoError
+from .xmlstream import iter_records, CHUNK_SIZE
 
 DEFAULT_TIMEOUT = 4
 
+logger = logging.getLogger(__name__)
+
 def password_hash(password):
     return hashlib.sha1(str(password).encode('utf-8')).hexdigest()
 
-class IikoServer(object):
+def _token_response(url, token):
+    """Ответ авторизации с токеном из аренды, чтобы login() всегда возвращал requests.Response"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = 'utf-8'
+    response._content = token.encode('utf-8')
+    return response
+
+class IikoServer(BaseClient):
     """Класс отвечающий за работы с iikoSeverApi
 
+    :param session: (optional) готовая requests.Session, если пул соединений нужно разделить между клиентами.
+    :param pool_connections: количество хостов, для которых хранится пул соединений.
+    :param pool_maxsize: максимальное количество keep-alive соединений к одному хосту.
+    :param pool_block: не открывать соединения сверх pool_maxsize, а ждать освобождения.
+    :param lease: (optional) :class:`~Pyiiko2.lease.TokenLease`, через который токен разделяется \
+    между процессами и потоками. Клиент с арендой не разлогинивается при закрытии.
+    :param limiter: (optional) :class:`~Pyiiko2.limiter.AdaptiveLimiter`, ограничивающий частоту \
+    и количество одновременных запросов к серверу.
+    :param retry: (optional) :class:`~Pyiiko2.retry.RetryPolicy` для повтора GET-запросов.
+    :param breaker: (optional) :class:`~Pyiiko2.retry.CircuitBreaker`, например ``CircuitBreaker.for_host(ip, port)``.
+    :param metrics: (optional) :class:`~Pyiiko2.metrics.Metrics` для учета запросов по методам API.
+    :param cache: (optional) :class:`~Pyiiko2.cache.ResponseCache` для ответов справочников \
+    (подразделения, склады, группы, терминалы, сотрудники, поставщики, дерево событий).
 
     """
 
-    def __init__(self, ip=None, port=None, login=None, passhash=None, token=None, timeout=DEFAULT_TIMEOUT):
+    def __init__(self, ip=None, port=None, login=None, passhash=None, token=None, timeout=DEFAULT_TIMEOUT,
+                 session=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False, lease=None, limiter=None, retry=None, breaker=None, metrics=None,
+                 cache=None):
         self.address = 'http://' + ip + ':'+ (str(port) or '80') + '/resto/'
         self._login = login
         self._passhash = passhash
         self._token = token
+        self._lease = lease
+        self._cache = cache
         self.set_timeout(timeout)
+        self._init_session(session, pool_connections, pool_maxsize, pool_block, limiter, retry, breaker, metrics)
 
     @property
     def timeout(self):
@@ -34,8 +69,21 @@ class IikoServer(object):
 
 
     def __del__(self):
-        if self._token is not None:
-            self.logout()
+        self.close()
+
+    def close(self):
+        """Уничтожает токен и закрывает пул соединений
+
+        Токен, полученный через аренду, не уничтожается: им пользуются другие клиенты.
+        """
+        if getattr(self, '_lease', None) is not None:
+            self._token = None
+        if getattr(self, '_token', None) is not None and getattr(self, '_session', None) is not None:
+            try:
+                self.logout()
+            except IikoError:
+                self._token = None  # сервер недоступен, слот лицензии освободится по истечении токена
+        super().close()
 
     def login(self):
         """Метод получает новый токен
@@ -48,85 +96,115 @@ class IikoServer(object):
              token-ом вызовет ошибку. Если вам негде хранить token при работе с сервером API,
              рекомендуем вам разлогиниться, что приводит к отпусканию лицензии.
 
-            """
+            Если клиенту передана аренда токена, метод берет общий токен из нее и возвращает
+            ответ с кодом 200 и токеном в text, как при обычной авторизации.
 
-        try:
-            # Уничтожаем токен, если он он существует
-            if self._token is not None:
-                self.logout()
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        if self._lease is not None:
+            self._token = self._lease.token(self)
+            return _token_response(self.address + 'api/auth', self._token)
+
+        # Уничтожаем токен, если он он существует
+        if self._token is not None:
+            self.logout()
 
-            url = self.address + 'api/auth?login=' + self._login + "&pass=" + self._passhash
-            login = requests.get(url=url, timeout=self.timeout)
-            if login.status_code == 200:
-                self._token = login.text
-            return login
+        login = self._auth()
+        if login.status_code == 200:
+            self._token = login.text
+        return login
 
-        except Exception as e:
-            print(e)
+    def _auth(self):
+        url = self.address + 'api/auth?login=' + self._login + "&pass=" + self._passhash
+        return self._request('GET', url)
+
+    def _revoke(self, token):
+        return self._request('GET', self.address + 'api/logout?key=' + token)
 
     def logout(self):
         """
         Уничтожение токена
-        """
-
-        try:
-            logout = requests.get(
-                self.address + 'api/logout?key=' + self.token)
-            print("\nТокен уничтожен: " + self.token)
-            self._token = None
-            return logout
 
-        except requests.exceptions.ConnectTimeout:
-            print("Не удалось подключиться к серверу")
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        logout = self._revoke(self.token)
+        logger.debug('Токен уничтожен: %s', self.address)
+        self._token = None
+        return logout
 
     def version(self):
         """Позволяет узнать версию iiko
 
         :returns: Версия iiko в формате string
+        :raises IikoConnectionError: сервер недоступен.
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
         """
-        try:
-            ver = requests.get(
-                self.address + 'get_server_info.jsp?encoding=UTF-8').text
-            tree = parse(StringIO(ver))
-            version = ''.join(tree.xpath(r'//version/text()'))
-            return version
-
-        except requests.exceptions.ConnectTimeout:
-            print("Не удалось подключиться к серверу")
+        ver = self._request('GET', self.address + 'get_server_info.jsp?encoding=UTF-8').text
+        tree = parse(StringIO(ver))
+        return tree.findtext('.//version')
 
     def server_info(self):
         """Вовращает json файл с информацией о сервере и статусе лицензии
 
                 :returns: request
+                :raises IikoConnectionError: сервер недоступен.
+                :raises IikoTimeout: сервер не ответил за timeout секунд.
                 """
-        try:
-            return requests.get(
-                self.address + 'get_server_info.jsp?encoding=UTF-8')
-
-        except requests.exceptions.ConnectTimeout:
-            print("Не удалось подключиться к серверу")
+        return self._request('GET', self.address + 'get_server_info.jsp?encoding=UTF-8')
 
-    def get(self, path, params=None):
+    def get(self, path, params=None, stream=False):
         """
         Возвращает request по заданному пути с использованием токена авторизации
+
+        :param stream: не читать тело ответа сразу, а отдавать его через iter_content. Такие запросы \
+        не кэшируются.
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
         """
-        try:
-            url = self.address + path + "?key=" + self.token
-            return requests.get(url=url, params=params, timeout=self.timeout)
-        except Exception as e:
-            print(path)
-            print(e)
+        if self._cache is not None and not stream:
+            return self._cache.get(self, path, params)
+        return self._call('GET', path, params=params, stream=stream)
 
     def post(self, path, data=None, json=None, headers=None):
         """
         Возвращает request по заданному пути с использованием токена авторизации
+
+        :raises IikoConnectionError: сервер недоступен (в том числе CircuitOpenError).
+        :raises IikoTimeout: сервер не ответил за timeout секунд.
+        """
+        return self._call('POST', path, data=data, json=json, headers=headers)
+
+    def iter_records(self, path, tag, params=None, chunk_size=CHUNK_SIZE):
+        """Генератор элементов-записей XML-ответа, разбираемого по мере загрузки
+
+        Тело читается кусками по chunk_size байт, в памяти держится только текущая запись.
+
+        :param tag: имя тега записи, например ``document``.
         """
+        response = self._call('GET', path, params=params, stream=True)
         try:
-            url = self.address + path + "?key=" + self.token
-            return requests.post(url=url, data=data, json=json, headers=headers, timeout=self.timeout)
-        except Exception as e:
-            print(path)
-            print(e)
+            response.raise_for_status()
+            yield from iter_records(response.iter_content(chunk_size), tag)
+        finally:
+            response.close()
+
+    def _get_or_records(self, path, params, records, tag, stream=False):
+        if records:
+            return self.iter_records(path, records if isinstance(records, str) else tag, params)
+        return self.get(path, params=params, stream=stream)
+
+    def _call(self, method, path, **kwargs):
+        """Выполняет запрос с токеном; при аренде токена один раз повторяет запрос после ответа 401"""
+        if self._lease is not None:
+            self._token = self._lease.token(self)
+        response = self._request(method, self.address + path + "?key=" + self.token, **kwargs)
+        if response.status_code == 401 and self._lease is not None:
+            response.close()  # при stream=True соединение иначе не вернется в пул
+            self._token = self._lease.invalidate(self, self._token)
+            response = self._request(method, self.address + path + "?key=" + self.token, **kwargs)
+        return response
 # ----------------------------------Корпорации----------------------------------
 
     def departments(self, **kwargs):
@@ -233,7 +311,7 @@ class IikoServer(object):
         return self.get("api/corporation/employees", params=kwargs)
 
 # ----------------------------------События----------------------------------
-    def events(self, **kwargs):
+    def events(self, records=False, **kwargs):
         """Список событий.
 
 
@@ -247,9 +325,12 @@ class IikoServer(object):
         новых событий. В штатном режиме одно и тоже событие повторно с разными ревизиями не приходит, однако \
         такой гарантии не даётся. ID (UUID) события уникален, может использоваться в качестве ключа.
 
+        :param records: (optional) разобрать ответ потоково и вернуть генератор элементов ``<event>`` \
+        вместо request. Можно передать имя тега записи строкой.
+
         :returns: request
         """
-        return self.get("api/events", params=kwargs)
+        return self._get_or_records("api/events", kwargs, records, 'event')
 
     def events_filter(self, body):
         """
@@ -395,7 +476,7 @@ class IikoServer(object):
 
 # ----------------------------------Отчеты----------------------------------
 
-    def olap(self, **kwargs):
+    def olap(self, stream=False, **kwargs):
         """OLAP-отчет
 
         :param report: (Тип отчета)
@@ -428,12 +509,15 @@ class IikoServer(object):
                 - Описание полей OLAP отчета по доставкам.
             По полю можно проводить группировку, если значение в колонке Grouping для поля равно true.
 
+        :param stream: (optional) не читать ответ сразу: тело загружается и распаковывается (gzip/deflate) \
+        по мере чтения ``iter_content``/``iter_lines``, и разбор может идти одновременно с загрузкой.
+
         :returns: request
 
         """
-        return self.get("api/reports/olap", params=kwargs)
+        return self.get("api/reports/olap", params=kwargs, stream=stream)
 
-    def store_operation(self, **kwargs):
+    def store_operation(self, records=False, stream=False, **kwargs):
         """Отчет по складским операциям
 
         :param dateFrom: (DD.MM.YYYY) Начальная дата.
@@ -446,10 +530,15 @@ class IikoServer(object):
         по типам документов. В противном случае коррекции включаются.
         :param presetId: (GUID) - (optional) Id преднастроенного отчета. Если указан, то все настройки, кроме дат, игнорируются.
 
+        :param records: (optional) разобрать ответ потоково и вернуть генератор элементов ``<storeReportItemDto>`` \
+        вместо request. Можно передать имя тега записи строкой.
+        :param stream: (optional) не читать ответ сразу: тело загружается и распаковывается (gzip/deflate) \
+        по мере чтения ``iter_content``/``iter_lines``, и разбор может идти одновременно с загрузкой.
+
         :returns: request
 
         """
-        return self.get("api/reports/storeOperations", params=kwargs)
+        return self._get_or_records("api/reports/storeOperations", kwargs, records, 'storeReportItemDto', stream)
 
     def store_presets(self, **kwargs):
         """Пресеты отчетов по складским операциям
@@ -459,7 +548,7 @@ class IikoServer(object):
         """
         return self.get("api/reports/storeReportPresets", params=kwargs)
 
-    def product_expense(self, departament, **kwargs):
+    def product_expense(self, departament=None, **kwargs):
         """Расход продуктов по продажам
 
         :param department: (GUID) Подразделение
@@ -470,9 +559,11 @@ class IikoServer(object):
 
         :returns: request
         """
+        if departament is not None:
+            kwargs['department'] = departament
         return self.get("api/reports/productExpense", params=kwargs)
 
-    def sales(self, **kwargs):
+    def sales(self, stream=False, **kwargs):
         """Отчет по выручке
 
         :param department: (GUID) Подразделение
@@ -482,10 +573,12 @@ class IikoServer(object):
         :param hourTo: (hh) Час окончания интервала выборки в сутках (по умолчанию -1, все время), по умолчанию -1.
         :param dishDetails: (boolean) Включать ли разбивку по блюдам (true/false), по умолчанию false.
         :param allRevenue: (boolean)  Фильтрация по типам оплат (true - все типы, false - только выручка), по умолчанию true.
+        :param stream: (optional) не читать ответ сразу: тело загружается и распаковывается (gzip/deflate) \
+        по мере чтения ``iter_content``/``iter_lines``, и разбор может идти одновременно с загрузкой.
 
         :returns: request
         """
-        return self.get("api/reports/sales", params=kwargs)
+        return self.get("api/reports/sales", params=kwargs, stream=stream)
 
     def mounthly_plan(self, **kwargs):
         """План по выручке за день
@@ -500,7 +593,7 @@ class IikoServer(object):
         """
         return self.get("api/reports/monthlyIncomePlan", params=kwargs)
 
-    def ingredient_entry(self, **kwargs):
+    def ingredient_entry(self, stream=False, **kwargs):
         """Отчет о вхождении товара в блюдо
 
         :param department: (GUID) Подразделение
@@ -508,10 +601,12 @@ class IikoServer(object):
         :param dateTo: (DD.MM.YYYY) Конечная дата.
         :param productArticle: (string) Артикул продукта (приоритет поиска:productArticle, product)
         :param includeSubtree: (bool) - (optional) Включать ли в отчет строки поддеревьев (по умолчанию false)
+        :param stream: (optional) не читать ответ сразу: тело загружается и распаковывается (gzip/deflate) \
+        по мере чтения ``iter_content``/``iter_lines``, и разбор может идти одновременно с загрузкой.
 
         :returns: request
         """
-        return self.get("api/reports/ingredientEntry", params=kwargs)
+        return self.get("api/reports/ingredientEntry", params=kwargs, stream=stream)
 
     def olap2(self, json=None):
         """Поля OLAP-отчета
@@ -554,7 +649,7 @@ class IikoServer(object):
 
 # ----------------------------------Накладные----------------------------------
 
-    def invoice_in(self, **kwargs):
+    def invoice_in(self, records=False, **kwargs):
         """Выгрузка приходных накладных
 
         :param from: начальная дата (входит в интервал).
@@ -564,11 +659,14 @@ class IikoServer(object):
         :param supplierId: Id поставщика.
         :type supplierId: GUID
 
+        :param records: (optional) разобрать ответ потоково и вернуть генератор элементов ``<document>`` \
+        вместо request. Можно передать имя тега записи строкой.
+
         :returns: request
         """
-        return self.get("api/documents/export/incomingInvoice", params=kwargs)
+        return self._get_or_records("api/documents/export/incomingInvoice", kwargs, records, 'document')
 
-    def invoice_out(self, **kwargs):
+    def invoice_out(self, records=False, **kwargs):
         """Выгрузка расходных накладных
 
         :param from: начальная дата (входит в интервал).
@@ -580,9 +678,12 @@ class IikoServer(object):
 
         При запросе без постащиков возвращает все расходные накладные, попавшие в интервал.
 
+        :param records: (optional) разобрать ответ потоково и вернуть генератор элементов ``<document>`` \
+        вместо request. Можно передать имя тега записи строкой.
+
         :returns: request
         """
-        return self.get("api/documents/export/outgoingInvoice", params=kwargs)
+        return self._get_or_records("api/documents/export/outgoingInvoice", kwargs, records, 'document')
 
     def invoice_number_in(self, **kwargs):
         """Выгрузка приходной накладной по ее номеру
@@ -649,7 +750,7 @@ class IikoServer(object):
         """
         return self.get("api/closeSession/list", params=kwargs)
 
-    def session(self, **kwargs):
+    def session(self, records=False, **kwargs):
         """Информация о кассовых сменах
 
         :param from_time: Время с которого запрашиваются данные по кассовым сменам, в формате ISO.
@@ -657,10 +758,13 @@ class IikoServer(object):
         :param to_time:  Время по которое (не включительно) запрашиваются данные по кассовым сменам в формате ISO.
         :type to: yyyy-MM-ddTHH:mm:ss.SSS
 
+        :param records: (optional) разобрать ответ потоково и вернуть генератор элементов ``<session>`` \
+        вместо request. Можно передать имя тега записи строкой.
+
         :returns: request
 
         """
-        return self.get("api/events/sessions", params=kwargs)
+        return self._get_or_records("api/events/sessions", kwargs, records, 'session')
 
 # ----------------------------------EDI----------------------------------
 
@@ -683,9 +787,5 @@ class IikoServer(object):
         :returns: request
 
         """
-        try:
-            url = self.address + 'edi/' + edi + '/orders/bySeller'
-            return requests.get(url, params=kwargs, timeout=self.timeout)
-
-        except Exception as e:
-            print(e)
+        url = self.address + 'edi/' + edi + '/orders/bySeller'
+        return self._request('GET', url, params=kwargs)
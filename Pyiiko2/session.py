@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .exceptions import IikoError, IikoConnectionError, IikoTimeout, CircuitOpenError
+from .metrics import endpoint_label
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+def make_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False):
+    """Создает requests.Session с пулом keep-alive соединений
+
+    :param pool_connections: количество хостов, для которых хранится отдельный пул соединений.
+    :param pool_maxsize: максимальное количество keep-alive соединений, которые держатся открытыми к одному хосту.
+    :param pool_block: если True, то pool_maxsize становится жестким лимитом на хост: при исчерпании пула \
+    запрос ждет свободное соединение, а не открывает новое.
+
+    Сессия запрашивает сжатые ответы (gzip, deflate); requests распаковывает их прозрачно, в том числе
+    при потоковом чтении через iter_content и iter_lines.
+
+    :returns: requests.Session
+    """
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class LineSplitter(object):
+    """Делит поток байтов на строки, в том числе когда разделитель попал на границу кусков
+
+    Без delimiter строки делятся по \\n, завершающий \\r отбрасывается. Многобайтовый delimiter
+    распознается, даже если он разрезан между кусками::
+
+        >>> splitter = LineSplitter(b'\\r\\n')
+        >>> splitter.feed(b'a\\r'), splitter.feed(b'\\nb'), splitter.close()
+        ([], [b'a'], [b'b'])
+        >>> splitter = LineSplitter()
+        >>> splitter.feed(b'a\\r'), splitter.feed(b'\\nb'), splitter.close()
+        ([], [b'a'], [b'b'])
+    """
+
+    def __init__(self, delimiter=None):
+        self._strip = delimiter is None
+        self._separator = delimiter.encode() if isinstance(delimiter, str) else delimiter or b'\n'
+        self._pending = []
+        self._tail = b''
+
+    def feed(self, chunk):
+        size = len(self._separator) - 1
+        if self._separator not in chunk and (not size or self._separator not in self._tail + chunk[:size]):
+            # длинная строка копится кусками, а не склеивается на каждом шаге
+            self._pending.append(chunk)
+            if size:
+                self._tail = (self._tail + chunk[-size:])[-size:]
+            return []
+        lines = b''.join(self._pending + [chunk]).split(self._separator)
+        self._pending = [lines.pop()]
+        self._tail = self._pending[0][-size:] if size else b''
+        return [line.rstrip(b'\r') for line in lines] if self._strip else lines
+
+    def close(self):
+        pending, self._pending, self._tail = b''.join(self._pending), [], b''
+        if self._strip:
+            pending = pending.rstrip(b'\r')
+        return [pending] if pending else []
+
+
+def iter_lines(response, chunk_size=64 * 1024, decode_unicode=False, delimiter=None):
+    """Генератор строк тела ответа, открытого с stream=True, по мере загрузки
+
+    В отличие от requests.Response.iter_lines не дает лишних пустых строк, когда \\r\\n разделен \
+    границей кусков. Сжатое тело распаковывается по ходу чтения.
+    """
+    splitter = LineSplitter(delimiter)
+    encoding = response.encoding or 'utf-8'
+    try:
+        for chunk in response.iter_content(chunk_size):
+            for line in splitter.feed(chunk):
+                yield line.decode(encoding) if decode_unicode else line
+        for line in splitter.close():
+            yield line.decode(encoding) if decode_unicode else line
+    finally:
+        response.close()
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
+
+
+def _response_size(response, stream):
+    """Размер тела ответа в байтах, переданных по сети (до распаковки gzip)
+
+    Без Content-Length размер прочитанного ответа берется из счетчика urllib3, а у потокового \
+    ответа, тело которого еще не прочитано, считается нулевым.
+    """
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        pass
+    if stream:
+        return 0
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content or b'')
+
+
+class BaseClient(object):
+    """Общая часть клиентов iiko: собственный пул соединений и его жизненный цикл
+
+    Все запросы клиента проходят через :meth:`_request` и переиспользуют соединения из пула.
+    Ошибки соединения и таймауты выбрасываются как :class:`~Pyiiko2.exceptions.IikoConnectionError` и
+    :class:`~Pyiiko2.exceptions.IikoTimeout`; политика повторов и размыкатель цепи задаются параметрами
+    retry и breaker (см. :mod:`Pyiiko2.retry`), учет запросов — параметром metrics (см. :mod:`Pyiiko2.metrics`).
+    Клиент можно использовать как контекстный менеджер::
+
+        with IikoServer(ip=ip, port=port, login=login, passhash=passhash) as iiko:
+            iiko.login()
+            iiko.stores()
+    """
+
+    def _init_session(self, session=None, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                      pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False, limiter=None, retry=None,
+                      breaker=None, metrics=None):
+        self._own_session = session is None
+        self._session = session or make_session(pool_connections, pool_maxsize, pool_block)
+        self._limiter = limiter
+        self._retry = retry
+        self._breaker = breaker
+        self._metrics = metrics
+
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def _endpoint(self, url):
+        """Логический адрес метода для метрик: путь относительно адреса сервера без параметров"""
+        if url.startswith(self.address):
+            url = url[len(self.address):]
+        return endpoint_label(url)
+
+    def _request(self, method, url, **kwargs):
+        if self._session is None:
+            raise IikoError('Клиент закрыт, запрос не отправлялся: ' + self.address)
+        kwargs.setdefault('timeout', self.timeout)
+        metrics = self._metrics
+        endpoint = self._endpoint(url) if metrics is not None else None
+        attempt = 0
+        while True:
+            if self._breaker is not None and not self._breaker.allow():
+                raise CircuitOpenError('Сервер не отвечает, запрос не отправлялся: ' + self.address)
+            if metrics is not None:
+                metrics.request_started(endpoint, method, attempt)
+                started = time.monotonic()
+            response = error = None
+            try:
+                response = self._send(method, url, **kwargs)
+            except requests.exceptions.Timeout as e:
+                error = IikoTimeout(e, request=e.request)
+            except requests.exceptions.RequestException as e:
+                # в том числе ChunkedEncodingError и ContentDecodingError при чтении тела
+                error = IikoConnectionError(e, request=e.request)
+            finally:
+                # выполняется и при непредвиденном исключении: пробный запрос размыкателя не зависает
+                failed = response is None
+                if metrics is not None:
+                    if failed:
+                        metrics.request_finished(endpoint, method, attempt, None, time.monotonic() - started, 0,
+                                                 error or sys.exc_info()[1])
+                    else:
+                        metrics.request_finished(endpoint, method, attempt, response.status_code,
+                                                 time.monotonic() - started,
+                                                 _response_size(response, kwargs.get('stream')))
+                if self._breaker is not None:
+                    self._breaker.record(failed or response.status_code >= 500)
+            retry = self._retry
+            if (retry is not None and retry.can_retry(method, attempt)
+                    and (error is not None or response.status_code in retry.statuses)):
+                delay = retry.delay(attempt)
+                if error is None:
+                    delay = max(delay, _retry_after(response))
+                    response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if error is not None:
+                raise error
+            return response
+
+    def _send(self, method, url, **kwargs):
+        if self._limiter is None:
+            return self._session.request(method, url, **kwargs)
+        with self._limiter.acquire() as slot:
+            response = self._session.request(method, url, **kwargs)
+            slot.record(response.status_code)
+            return response
+
+    def close(self):
+        """Закрывает пул соединений клиента
+
+        Переданная снаружи сессия не закрывается. Запросы после закрытия завершаются :class:`IikoError`.
+        """
+        session = getattr(self, '_session', None)
+        if session is not None and self._own_session:
+            session.close()
+        self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
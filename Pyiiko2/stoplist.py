@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Лента изменений стоп-листа доставки iikoBiz
+
+:class:`StopListWatcher` параллельно опрашивает ``stop_list`` по нескольким организациям,
+сравнивает ответ с прошлым снимком и отдает только изменения: блюдо встало в стоп, снято со
+стопа или у него изменился остаток. Изменения передаются подписчикам и (или) в asyncio.Queue::
+
+    watcher = StopListWatcher(biz, [org_id, other_org_id])
+    watcher.subscribe(lambda change: print(change.kind, change.product_id, change.balance))
+    watcher.run()
+
+С :class:`~Pyiiko2.aio.AsyncIikoBiz` используется ``await watcher.async_run()``.
+"""
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_INTERVAL = 5
+DEFAULT_WORKERS = 4
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+class StopChange(namedtuple('StopChange', 'kind organization terminal product_id balance previous_balance')):
+    """Изменение стоп-листа
+
+    :attr kind: ``added`` — блюдо встало в стоп, ``removed`` — снято со стопа, ``changed`` — изменился \
+    остаток.
+    :attr terminal: deliveryTerminalId, к которому относится запись, или None.
+    :attr balance: остаток; None для ``removed``.
+    :attr previous_balance: остаток в прошлом снимке; None для ``added``.
+    """
+
+    __slots__ = ()
+
+
+def snapshot(result):
+    """Снимок стоп-листа: словарь ``{(deliveryTerminalId, productId): balance}``"""
+    entries = result.get('stopList', []) if isinstance(result, dict) else result
+    items = {}
+    for entry in entries or ():
+        terminal = entry.get('deliveryTerminalId')
+        for item in entry.get('items') or ():
+            items[(terminal, item['productId'])] = item.get('balance')
+    return items
+
+
+def diff(organization, previous, current):
+    """Изменения между двумя снимками :func:`snapshot`"""
+    old, new = previous.keys(), current.keys()
+    changes = [StopChange(ADDED, organization, key[0], key[1], current[key], None) for key in new - old]
+    changes.extend(StopChange(REMOVED, organization, key[0], key[1], None, previous[key]) for key in old - new)
+    changes.extend(StopChange(CHANGED, organization, key[0], key[1], current[key], previous[key])
+                   for key in new & old if current[key] != previous[key])
+    return changes
+
+
+class StopListWatcher(object):
+    """Опрос стоп-листов организаций с выдачей только изменений
+
+    :param biz: IikoBiz или AsyncIikoBiz.
+    :param organizations: id организаций.
+    :param interval: пауза между опросами в секундах.
+    :param max_workers: максимальное количество одновременных запросов (для IikoBiz).
+    :param queue: (optional) asyncio.Queue, в которую кладется каждое изменение.
+    """
+
+    def __init__(self, biz, organizations, interval=DEFAULT_INTERVAL, max_workers=DEFAULT_WORKERS, queue=None):
+        self.biz = biz
+        self.organizations = list(organizations)
+        self.interval = interval
+        self.max_workers = max_workers
+        self.queue = queue
+        self.errors = {}
+        self._callbacks = []
+        self._snapshots = {}
+
+    def subscribe(self, callback):
+        """Регистрирует callback(change), вызываемый для каждого изменения
+
+        :returns: callback, поэтому метод можно использовать как декоратор.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def snapshot(self, organization):
+        """Последний полученный снимок организации (см. :func:`snapshot`)"""
+        return dict(self._snapshots.get(organization, {}))
+
+    def _apply(self, organization, response):
+        """Сравнивает ответ со снимком; ошибка организации не мешает остальным"""
+        try:
+            response.raise_for_status()
+            current = snapshot(response.json())
+        except Exception as e:
+            self.errors[organization] = e
+            return []
+        self.errors.pop(organization, None)
+        changes = diff(organization, self._snapshots.get(organization, {}), current)
+        self._snapshots[organization] = current
+        return changes
+
+    def _publish(self, changes):
+        for change in changes:
+            for callback in list(self._callbacks):
+                callback(change)
+            if self.queue is not None:
+                self.queue.put_nowait(change)
+        return changes
+
+    def _fetch(self, organization):
+        try:
+            return self.biz.stop_list(organization=organization)
+        except Exception as e:
+            return e
+
+    def poll(self):
+        """Один опрос всех организаций
+
+        :returns: список :class:`StopChange`; ошибки по организациям — в :attr:`errors`.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = list(executor.map(self._fetch, self.organizations))
+        return self._collect(responses)
+
+    async def async_poll(self):
+        responses = await asyncio.gather(*(self.biz.stop_list(organization=organization)
+                                           for organization in self.organizations), return_exceptions=True)
+        return self._collect(responses)
+
+    def _collect(self, responses):
+        changes = []
+        for organization, response in zip(self.organizations, responses):
+            if isinstance(response, Exception):
+                self.errors[organization] = response
+                continue
+            changes.extend(self._apply(organization, response))
+        return self._publish(changes)
+
+    def run(self):
+        """Опрашивает стоп-листы, пока не будет прерван"""
+        while True:
+            self.poll()
+            time.sleep(self.interval)
+
+    async def async_run(self):
+        while True:
+            await self.async_poll()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Потоковый разбор XML-ответов iiko
+
+Тело ответа подается в парсер кусками, по мере поступления из сети. Дерево строится только для
+текущей записи (например ``<event>`` или ``<document>``), поэтому память не растет вместе с
+размером ответа::
+
+    response = iiko.get('api/events', params={'from_rev': 100}, stream=True)
+    for event in iter_records(response.iter_content(CHUNK_SIZE), 'event'):
+        print(event.findtext('id'))
+"""
+from xml.etree.ElementTree import TreeBuilder
+
+from defusedxml.ElementTree import XMLParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _RecordTarget(object):
+    """Цель парсера, собирающая поддеревья записей и значения листьев вне записей"""
+
+    def __init__(self, tags):
+        self.tags = tags
+        self.records = []
+        self.values = {}
+        self._builder = None
+        self._depth = 0
+        self._text = []
+
+    def start(self, tag, attrib):
+        if self._builder is not None:
+            self._depth += 1
+            self._builder.start(tag, attrib)
+        elif tag in self.tags:
+            self._depth = 1
+            self._builder = TreeBuilder()
+            self._builder.start(tag, attrib)
+        else:
+            self._text = []
+
+    def end(self, tag):
+        if self._builder is not None:
+            self._builder.end(tag)
+            self._depth -= 1
+            if self._depth == 0:
+                self.records.append(self._builder.close())
+                self._builder = None
+        else:
+            text = ''.join(self._text).strip()
+            if text:
+                self.values[tag] = text
+            self._text = []
+
+    def data(self, data):
+        if self._builder is not None:
+            self._builder.data(data)
+        else:
+            self._text.append(data)
+
+    def close(self):
+        return None
+
+
+class RecordParser(object):
+    """Инкрементальный парсер XML, возвращающий записи по мере их закрытия
+
+    :param tags: имя тега записи или набор имен.
+
+    Значения листовых элементов вне записей (например ``<revision>``) доступны в :attr:`values`.
+    """
+
+    def __init__(self, tags):
+        self._target = _RecordTarget({tags} if isinstance(tags, str) else set(tags))
+        self._parser = XMLParser(target=self._target)
+
+    @property
+    def values(self):
+        return self._target.values
+
+    def feed(self, data):
+        """Передает парсеру очередной кусок тела и возвращает закрытые в нем записи"""
+        self._parser.feed(data)
+        return self._pop()
+
+    def close(self):
+        """Завершает разбор и возвращает оставшиеся записи"""
+        self._parser.close()
+        return self._pop()
+
+    def _pop(self):
+        records = self._target.records
+        self._target.records = []
+        return records
+
+
+def iter_records(chunks, tags, parser=None):
+    """Генератор элементов-записей из последовательности кусков XML
+
+    :param chunks: итерируемые куски тела ответа (bytes или str).
+    :param tags: имя тега записи или набор имен.
+    :param parser: (optional) готовый :class:`RecordParser`, чтобы после разбора прочитать его values.
+    """
+    parser = parser or RecordParser(tags)
+    for chunk in chunks:
+        if chunk:
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def element_to_dict(element):
+    """Преобразует элемент в словарь
+
+    Листья становятся строками, повторяющиеся дочерние элементы — списками.
+    """
+    if len(element) == 0:
+        return (element.text or '').strip()
+    result = {}
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag in result:
+            if not isinstance(result[child.tag], list):
+                result[child.tag] = [result[child.tag]]
+            result[child.tag].append(value)
+        else:
+            result[child.tag] = value
+    return result
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Синтетические ответы iikoServerApi и iikoBiz для бенчмарков
+
+Структура ответов повторяет реальную (поля, вложенность, форматы дат и GUID), значения
+генерируются детерминированно по seed, поэтому одинаковый размер дает одинаковые байты.
+"""
+import datetime
+import json
+import random
+import uuid
+from xml.sax.saxutils import escape
+
+DISHES = ('Борщ', 'Цезарь с курицей', 'Паста карбонара', 'Стейк рибай', 'Капучино', 'Чизкейк',
+          'Лимонад домашний', 'Суп том-ям', 'Пицца маргарита', 'Салат греческий')
+UNITS = ('кг', 'л', 'шт', 'порц')
+EVENT_TYPES = ('orderPaid', 'deletedPrintedItems', 'cookingItemCooked', 'cashRegisterOpen', 'storno')
+
+
+def _guid(rnd):
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+
+def _moment(rnd, base=datetime.datetime(2020, 1, 1)):
+    return base + datetime.timedelta(seconds=rnd.randrange(365 * 24 * 3600))
+
+
+def olap2(rows, seed=1):
+    """Ответ api/v2/reports/olap: rows строк продаж"""
+    rnd = random.Random(seed)
+    departments = ['Ресторан %d' % i for i in range(1, 11)]
+    data = [{
+        'Department': rnd.choice(departments),
+        'OpenDate.Typed': _moment(rnd).strftime('%Y-%m-%d'),
+        'DishName': rnd.choice(DISHES),
+        'DishCode': str(rnd.randrange(1, 2000)),
+        'DishAmountInt': rnd.randrange(1, 20),
+        'DishDiscountSumInt': round(rnd.uniform(50, 5000), 2),
+        'DishSumInt': round(rnd.uniform(50, 5000), 2),
+    } for _ in range(rows)]
+    return json.dumps({'data': data, 'summary': []}, ensure_ascii=False).encode('utf-8')
+
+
+def events(count, seed=2):
+    """Ответ api/events: count событий с атрибутами"""
+    rnd = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?><eventsList>']
+    for i in range(count):
+        parts.append('<event><id>%s</id><date>%s</date><type>%s</type>'
+                     '<departmentId>%s</departmentId>' % (_guid(rnd), _moment(rnd).isoformat() + '.000+03:00',
+                                                          rnd.choice(EVENT_TYPES), _guid(rnd)))
+        for name in ('orderNum', 'sum', 'user'):
+            parts.append('<attribute><name>%s</name><value>%s</value></attribute>' % (
+                name, rnd.randrange(1, 100000) if name != 'user' else escape('Кассир %d' % rnd.randrange(20))))
+        parts.append('</event>')
+    parts.append('<revision>%d</revision></eventsList>' % (count + 1))
+    return ''.join(parts).encode('utf-8')
+
+
+def invoice_in(documents, items=10, seed=3):
+    """Ответ api/documents/export/incomingInvoice: documents накладных по items строк"""
+    rnd = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?><incomingInvoiceDtoes>']
+    for i in range(documents):
+        parts.append('<document><id>%s</id><incomingDocumentNumber>%d</incomingDocumentNumber>'
+                     '<incomingDate>%s</incomingDate><documentNumber>%d</documentNumber>'
+                     '<supplier>%s</supplier><defaultStore>%s</defaultStore><status>PROCESSED</status><items>'
+                     % (_guid(rnd), rnd.randrange(10 ** 6), _moment(rnd).isoformat(), i + 1, _guid(rnd), _guid(rnd)))
+        for num in range(1, items + 1):
+            amount = rnd.randrange(1, 100)
+            price = round(rnd.uniform(10, 1000), 2)
+            parts.append('<item><num>%d</num><product>%s</product><productArticle>%05d</productArticle>'
+                         '<amount>%d.000000000</amount><price>%.2f</price><sum>%.2f</sum>'
+                         '<vatPercent>20.000000000</vatPercent><store>%s</store></item>'
+                         % (num, _guid(rnd), rnd.randrange(10 ** 5), amount, price, amount * price, _guid(rnd)))
+        parts.append('</items></document>')
+    parts.append('</incomingInvoiceDtoes>')
+    return ''.join(parts).encode('utf-8')
+
+
+def products2(count, seed=4):
+    """Ответ api/v2/entities/products/list: count элементов номенклатуры"""
+    rnd = random.Random(seed)
+    groups = [_guid(rnd) for _ in range(max(1, count // 50))]
+    data = [{
+        'id': _guid(rnd),
+        'deleted': rnd.random() < 0.05,
+        'name': '%s %d' % (rnd.choice(DISHES), i),
+        'description': '',
+        'num': '%05d' % (i + 1),
+        'code': str(rnd.randrange(1, 100000)),
+        'parent': rnd.choice(groups),
+        'modifiers': [],
+        'taxCategory': None,
+        'category': None,
+        'accountingCategory': _guid(rnd),
+        'color': {'red': rnd.randrange(256), 'green': rnd.randrange(256), 'blue': rnd.randrange(256)},
+        'fontColor': {'red': 0, 'green': 0, 'blue': 0},
+        'frontImageId': None,
+        'position': None,
+        'mainUnit': _guid(rnd),
+        'excludedSections': None,
+        'defaultSalePrice': round(rnd.uniform(50, 3000), 2),
+        'placeType': None,
+        'defaultIncludedInMenu': True,
+        'type': rnd.choice(('DISH', 'GOODS', 'PREPARED', 'MODIFIER')),
+        'unitWeight': round(rnd.uniform(0.05, 1), 3),
+        'unitCapacity': 0,
+    } for i in range(count)]
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def nomenclature(count, seed=5):
+    """Ответ iikoBiz api/0/nomenclature/{organizationId}: count продуктов с модификаторами"""
+    rnd = random.Random(seed)
+    groups = [{'id': _guid(rnd), 'name': 'Группа %d' % i, 'parentGroup': None, 'order': i,
+               'isIncludedInMenu': True, 'isDeleted': False} for i in range(max(1, count // 50))]
+    modifiers = [_guid(rnd) for _ in range(20)]
+    products = [{
+        'id': _guid(rnd),
+        'code': str(rnd.randrange(1, 100000)),
+        'name': '%s %d' % (rnd.choice(DISHES), i),
+        'description': '',
+        'parentGroup': rnd.choice(groups)['id'],
+        'order': i,
+        'price': round(rnd.uniform(50, 3000), 2),
+        'weight': round(rnd.uniform(0.05, 1), 3),
+        'measureUnit': rnd.choice(UNITS),
+        'type': rnd.choice(('dish', 'good', 'modifier')),
+        'isIncludedInMenu': True,
+        'isDeleted': False,
+        'modifiers': [{'modifierId': m, 'minAmount': 0, 'maxAmount': 1, 'defaultAmount': 0, 'required': False}
+                      for m in rnd.sample(modifiers, rnd.randrange(4))],
+        'groupModifiers': [],
+        'tags': [],
+        'images': [],
+    } for i in range(count)]
+    return json.dumps({'groups': groups, 'products': products, 'productCategories': [],
+                       'revision': 1, 'uploadDate': '2020-01-01 00:00:00'}, ensure_ascii=False).encode('utf-8')
+
+
+def delivery_orders(count, seed=6):
+    """Ответ iikoBiz api/0/orders/deliveryOrders: count заказов доставки"""
+    rnd = random.Random(seed)
+    orders = []
+    for i in range(count):
+        items = [{'id': _guid(rnd), 'name': rnd.choice(DISHES), 'amount': rnd.randrange(1, 5),
+                  'sum': round(rnd.uniform(100, 2000), 2), 'modifiers': []} for _ in range(rnd.randrange(1, 6))]
+        orders.append({
+            'orderId': _guid(rnd),
+            'number': str(100000 + i),
+            'status': rnd.choice(('Новая', 'Готовится', 'В пути', 'Доставлена', 'Закрыта')),
+            'createdTime': _moment(rnd).strftime('%Y-%m-%d %H:%M:%S'),
+            'deliveryDate': _moment(rnd).strftime('%Y-%m-%d %H:%M:%S'),
+            'sum': round(sum(item['sum'] for item in items), 2),
+            'customer': {'id': _guid(rnd), 'name': 'Клиент %d' % rnd.randrange(10000),
+                         'phone': '+7900%07d' % rnd.randrange(10 ** 7)},
+            'address': {'city': 'Москва', 'street': 'Улица %d' % rnd.randrange(500), 'home': str(rnd.randrange(1, 200)),
+                        'apartment': str(rnd.randrange(1, 300))},
+            'items': items,
+            'courierInfo': {'courierId': _guid(rnd)} if rnd.random() < 0.5 else None,
+        })
+    return json.dumps({'deliveryOrders': orders}, ensure_ascii=False).encode('utf-8')
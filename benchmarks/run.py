@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Запуск бенчмарков клиентов против :class:`~benchmarks.server.FakeIikoServer`
+
+Каждый бенчмарк выполняется в отдельном процессе, чтобы пиковая память (RSS) относилась только к
+нему. Результаты записываются в JSON; с ``--baseline`` выводится сравнение с прошлым запуском::
+
+    python -m benchmarks.run --requests 200 --concurrency 8 --latency 0.01 --output 0.3.4.json
+    python -m benchmarks.run --baseline 0.3.4.json --output 0.3.5.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Pyiiko2.biz import IikoBiz
+from Pyiiko2.server import IikoServer
+from Pyiiko2.xmlstream import iter_records
+
+from .server import FakeIikoServer, DEFAULT_SIZES
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+OLAP_REQUEST = {
+    'reportType': 'SALES',
+    'groupByRowFields': ['Department', 'OpenDate.Typed', 'DishName', 'DishCode'],
+    'aggregateFields': ['DishAmountInt', 'DishDiscountSumInt', 'DishSumInt'],
+    'filters': {'OpenDate.Typed': {'filterType': 'DateRange', 'periodType': 'CUSTOM', 'from': '2020-01-01',
+                                   'to': '2021-01-01', 'includeLow': True, 'includeHigh': False}},
+}
+ORGANIZATION = '00000000-0000-0000-0000-000000000001'
+
+
+def _parse_json(body):
+    return json.loads(body)
+
+
+def _parse_xml(tag):
+    def parse(body):
+        return sum(1 for _ in iter_records([body], tag))
+    return parse
+
+
+def _consume(records):
+    return sum(1 for _ in records)
+
+
+# имя -> (клиент, вызов, разбор тела); если разбор None, вызов сам читает ответ потоково
+BENCHMARKS = {
+    'olap2': ('server', lambda c: c.olap2(json=OLAP_REQUEST), _parse_json),
+    'events': ('server', lambda c: c.events(), _parse_xml('event')),
+    'events_records': ('server', lambda c: _consume(c.events(records=True)), None),
+    'invoice_in': ('server', lambda c: c.invoice_in(**{'from': '2020-01-01', 'to': '2020-12-31'}),
+                   _parse_xml('document')),
+    'invoice_in_records': ('server', lambda c: _consume(c.invoice_in(records=True, **{
+        'from': '2020-01-01', 'to': '2020-12-31'})), None),
+    'products2': ('server', lambda c: c.products2(), _parse_json),
+    'nomenclature': ('biz', lambda c: c.nomenclature(ORGANIZATION), _parse_json),
+    'delivery_orders': ('biz', lambda c: c.delivery_orders(organization=ORGANIZATION, dateFrom='2020-01-01',
+                                                           dateTo='2020-12-31'), _parse_json),
+}
+
+
+def percentile(values, q):
+    """Перцентиль q (0..100) методом ближайшего ранга"""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100.0 * len(values) + 0.5)) - 1))]
+
+
+def peak_rss():
+    """Пиковый RSS текущего процесса в байтах или None, если платформа его не сообщает"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _client(kind, port, concurrency):
+    if kind == 'biz':
+        return IikoBiz(ip='127.0.0.1', port=port, token='bench', timeout=60, pool_maxsize=concurrency)
+    return IikoServer(ip='127.0.0.1', port=port, token='bench', timeout=60, pool_maxsize=concurrency)
+
+
+def run_benchmark(name, port, requests=50, concurrency=4, parse_repeat=5):
+    """Выполняет один бенчмарк в текущем процессе
+
+    :returns: словарь с результатами: rps, задержки p50/p99/mean (с), время разбора (с), \
+    размер ответа и пиковый RSS (байты).
+    """
+    kind, call, parse = BENCHMARKS[name]
+    client = _client(kind, port, concurrency)
+    body = None
+    if parse is not None:
+        body = call(client).content
+
+    def timed(_):
+        started = time.perf_counter()
+        result = call(client)
+        if parse is not None:
+            result.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    parse_time = None
+    if parse is not None:
+        timings = []
+        for _ in range(parse_repeat):
+            parse_started = time.perf_counter()
+            parse(body)
+            timings.append(time.perf_counter() - parse_started)
+        parse_time = statistics.median(timings)
+    client.close()
+    return {
+        'name': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'rps': requests / elapsed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies),
+        'parse_time': parse_time,
+        'bytes': len(body) if body is not None else None,
+        'peak_rss': peak_rss(),
+    }
+
+
+def _payload_name(name):
+    return name.split('_records')[0]
+
+
+def _run_isolated(args):
+    return run_benchmark(*args)
+
+
+def run(names=None, sizes=None, latency=0, requests=50, concurrency=4, parse_repeat=5, isolate=True):
+    """Запускает бенчмарки против нового поддельного сервера
+
+    :param names: (optional) имена бенчмарков из :data:`BENCHMARKS`; по умолчанию все.
+    :param isolate: выполнять каждый бенчмарк в отдельном процессе.
+    :returns: словарь ``{'meta': {...}, 'results': [...]}``.
+    """
+    names = list(names or BENCHMARKS)
+    results = []
+    with FakeIikoServer(sizes=sizes, latency=latency) as fake:
+        for name in names:
+            # ответ генерируется заранее, чтобы генерация не попала в замер
+            fake.payload(_payload_name(name))
+            args = (name, fake.port, requests, concurrency, parse_repeat)
+            if isolate:
+                with multiprocessing.get_context('spawn').Pool(1) as pool:
+                    results.append(pool.apply(_run_isolated, (args,)))
+            else:
+                results.append(run_benchmark(*args))
+        meta = {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': fake.sizes,
+            'latency': latency,
+            'requests': requests,
+            'concurrency': concurrency,
+        }
+    return {'meta': meta, 'results': results}
+
+
+def compare(current, baseline):
+    """Строки сравнения двух запусков: изменение rps, p99 и времени разбора в процентах"""
+    previous = {result['name']: result for result in baseline['results']}
+    lines = []
+    for result in current['results']:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        changes = []
+        for field in ('rps', 'p99', 'parse_time', 'peak_rss'):
+            if result.get(field) and before.get(field):
+                changes.append('%s %+.1f%%' % (field, (result[field] / before[field] - 1) * 100))
+        lines.append('%-20s %s' % (result['name'], ', '.join(changes)))
+    return lines
+
+
+def _format(result):
+    parse = '%.4f' % result['parse_time'] if result['parse_time'] is not None else '-'
+    rss = '%.1f' % (result['peak_rss'] / 2.0 ** 20) if result['peak_rss'] else '-'
+    return '%-20s %9.1f %9.4f %9.4f %10s %10s' % (result['name'], result['rps'], result['p50'], result['p99'],
+                                                 parse, rss)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарки Pyiiko2 против локального сервера iiko')
+    parser.add_argument('names', nargs='*', metavar='name', help='бенчмарки: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа сервера, с')
+    parser.add_argument('--size', action='append', default=[], metavar='NAME=N',
+                        help='размер ответа, например olap2=100000; по умолчанию %s' % DEFAULT_SIZES)
+    parser.add_argument('--parse-repeat', type=int, default=5)
+    parser.add_argument('--no-isolate', action='store_true', help='не запускать бенчмарки в отдельных процессах')
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    parser.add_argument('--baseline', help='результаты прошлого запуска для сравнения')
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('неизвестные бенчмарки: ' + ', '.join(sorted(unknown)))
+
+    sizes = {}
+    for size in args.size:
+        name, _, value = size.partition('=')
+        sizes[name] = int(value)
+    report = run(args.names, sizes, args.latency, args.requests, args.concurrency, args.parse_repeat,
+                 not args.no_isolate)
+
+    print('%-20s %9s %9s %9s %10s %10s' % ('benchmark', 'req/s', 'p50, s', 'p99, s', 'parse, s', 'RSS, MiB'))
+    for result in report['results']:
+        print(_format(result))
+    if args.baseline:
+        with open(args.baseline) as f:
+            print('\n'.join(['', 'по сравнению с ' + args.baseline] + compare(report, json.load(f))))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
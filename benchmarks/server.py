@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Локальный сервер, отвечающий как iikoServerApi (RMS) и iikoBiz
+
+Отдает синтетические ответы из :mod:`benchmarks.payloads` заданного размера с заданной
+задержкой. Ответы генерируются один раз при первом обращении::
+
+    with FakeIikoServer(sizes={'olap2': 100000}, latency=0.02) as fake:
+        iiko = IikoServer(ip='127.0.0.1', port=fake.port, token='bench')
+        iiko.olap2(json={...})
+"""
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import payloads
+
+DEFAULT_SIZES = {
+    'olap2': 10000,
+    'events': 10000,
+    'invoice_in': 1000,
+    'products2': 5000,
+    'nomenclature': 5000,
+    'delivery_orders': 1000,
+}
+
+# путь -> (имя ответа, тип содержимого); путь задается регулярным выражением без параметров
+ROUTES = [
+    (r'/resto/api/v2/reports/olap', 'olap2', 'application/json'),
+    (r'/resto/api/events', 'events', 'application/xml'),
+    (r'/resto/api/documents/export/incomingInvoice', 'invoice_in', 'application/xml'),
+    (r'/resto/api/v2/entities/products/list', 'products2', 'application/json'),
+    (r'/api/0/nomenclature/[^/]+', 'nomenclature', 'application/json'),
+    (r'/api/0/orders/deliveryOrders', 'delivery_orders', 'application/json'),
+]
+ROUTES = [(re.compile(pattern + '$'), name, ctype) for pattern, name, ctype in ROUTES]
+
+SERVICE = {
+    '/resto/api/auth': b'bench-token',
+    '/resto/api/logout': b'',
+    '/api/0/auth/access_token': b'"bench-token"',
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        path = self.path.split('?', 1)[0]
+        fake = self.server.fake
+        if path in SERVICE:
+            self._send(200, 'text/plain', SERVICE[path])
+            return
+        for pattern, name, ctype in ROUTES:
+            if pattern.match(path):
+                fake.wait(name)
+                self._send(200, ctype + '; charset=utf-8', fake.payload(name))
+                return
+        self._send(404, 'text/plain', b'not found')
+
+    def _send(self, status, ctype, body):
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+
+class FakeIikoServer(object):
+    """Поддельный сервер iiko в отдельном потоке
+
+    :param sizes: (optional) размеры ответов по именам из :data:`DEFAULT_SIZES` — количество строк, \
+    событий, документов, продуктов или заказов.
+    :param latency: задержка ответа в секундах; число или словарь по именам ответов.
+    :param host: адрес, на котором слушает сервер.
+    :param port: порт; 0 — любой свободный.
+    """
+
+    def __init__(self, sizes=None, latency=0, host='127.0.0.1', port=0):
+        self.sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+        self.latency = latency
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def payload(self, name):
+        """Тело ответа name; генерируется при первом обращении"""
+        with self._lock:
+            body = self._payloads.get(name)
+            if body is None:
+                body = self._payloads[name] = getattr(payloads, name)(self.sizes[name])
+            return body
+
+    def wait(self, name):
+        latency = self.latency.get(name, 0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
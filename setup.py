@@ -7,10 +7,14 @@ setup(
     author='Vadim Nareyko',
     author_email='vadim@nareyko.com',
     version='0.3.4',
-    packages=find_packages(),
+    packages=find_packages(exclude=('benchmarks', 'benchmarks.*')),
     include_package_data=True,
     install_requires=[
         'requests>=2.20.0',
         'defusedxml>=0.6.0'
-    ]
+    ],
+    extras_require={
+        'async': ['aiohttp>=3.7.0'],
+        'columnar': ['numpy>=1.17'],
+    }
 )
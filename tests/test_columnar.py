@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import json
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from Pyiiko2.columnar import Categorical, OlapTable  # noqa: E402
+
+REQUEST = {'groupByRowFields': ['Dish'], 'groupByColFields': ['Waiter'], 'aggregateFields': ['Sum', 'Amount']}
+
+ROWS = [
+    {'Dish': 'Борщ', 'Waiter': 'A', 'Sum': 100, 'Amount': 1},
+    {'Dish': 'Чай', 'Waiter': None, 'Sum': 50.5, 'Amount': 2},
+    {'Dish': 'Борщ', 'Waiter': 'B', 'Sum': None, 'Amount': 3},
+]
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.content = json.dumps(data).encode('utf-8')
+
+
+def same(a, b):
+    """Сравнение строк таблиц, в котором NaN равен NaN"""
+    def normalize(rows):
+        return [{name: None if isinstance(value, float) and math.isnan(value) else value
+                 for name, value in row.items()} for row in rows]
+    return normalize(a.to_rows()) == normalize(b.to_rows())
+
+
+def test_from_response_columns():
+    table = OlapTable.from_response(FakeResponse({'data': ROWS, 'summary': []}), REQUEST)
+    assert len(table) == 3
+    assert table.dimensions == ['Dish', 'Waiter']
+    assert table.measures == ['Sum', 'Amount']
+    assert isinstance(table['Dish'], Categorical)
+    assert table['Dish'].values() == ['Борщ', 'Чай', 'Борщ']
+    assert table['Waiter'].values() == ['A', None, 'B']
+    assert table['Amount'].tolist() == [1.0, 2.0, 3.0]
+    assert table['Sum'][0] == 100 and table['Sum'][1] == 50.5 and math.isnan(table['Sum'][2])
+
+
+def test_from_response_matches_from_rows_and_dict():
+    data = {'data': ROWS, 'summary': []}
+    table = OlapTable.from_response(FakeResponse(data), REQUEST)
+    assert same(table, OlapTable.from_rows(ROWS, ['Dish', 'Waiter'], ['Sum', 'Amount']))
+    assert same(table, OlapTable.from_response(data, REQUEST))
+
+
+def test_from_response_ignores_summary():
+    summary = [[{'Dish': 'Итого'}, {'Sum': 150.5, 'Total': 1}]]
+    table = OlapTable.from_response(FakeResponse({'data': ROWS, 'summary': summary}), REQUEST)
+    assert len(table) == 3
+    assert 'Total' not in table.columns
+    assert table['Dish'].values() == ['Борщ', 'Чай', 'Борщ']
+
+
+def test_from_response_missing_fields():
+    rows = [{'Dish': 'Борщ', 'Sum': 1}, {'Amount': 2}]
+    table = OlapTable.from_response(FakeResponse({'data': rows}), REQUEST)
+    assert table['Dish'].values() == ['Борщ', None]
+    assert table['Waiter'].values() == [None, None]
+    assert table['Sum'][0] == 1 and math.isnan(table['Sum'][1])
+    assert math.isnan(table['Amount'][0]) and table['Amount'][1] == 2
+
+
+def test_from_response_without_request_detects_numeric_fields():
+    table = OlapTable.from_response(FakeResponse({'data': ROWS}))
+    assert table.dimensions == ['Dish', 'Waiter']
+    assert table.measures == ['Sum', 'Amount']
+    assert same(table, OlapTable.from_rows(ROWS))
+
+
+def test_from_response_empty_data():
+    table = OlapTable.from_response(FakeResponse({'data': [], 'summary': []}), REQUEST)
+    assert len(table) == 0
+    assert table.dimensions == ['Dish', 'Waiter']
+    assert table.measures == ['Sum', 'Amount']
+
+
+def test_from_response_nested_values_are_empty():
+    rows = [{'Dish': {'id': 1}, 'Sum': 'x'}]
+    table = OlapTable.from_response(FakeResponse({'data': rows}), REQUEST)
+    assert table['Dish'].values() == [None]
+    assert math.isnan(table['Sum'][0])
+
+
+def test_filter_and_group_by():
+    table = OlapTable.from_response(FakeResponse({'data': ROWS}), REQUEST)
+    assert table.filter(Dish='Борщ')['Amount'].tolist() == [1.0, 3.0]
+    assert len(table.filter(Dish='Солянка')) == 0
+    grouped = table.group_by('Dish').sum('Sum', 'Amount')
+    assert grouped.to_rows() == [{'Dish': 'Борщ', 'Sum': 100.0, 'Amount': 4.0},
+                                 {'Dish': 'Чай', 'Sum': 50.5, 'Amount': 2.0}]
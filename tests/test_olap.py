@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from Pyiiko2.olap import merge_rows, request_period, shard_request, split_period
+
+D = datetime.date
+
+
+def test_merge_rows_sums_by_groups():
+    chunks = [
+        [{'Dish': 'Борщ', 'Waiter': 'A', 'Sum': 100, 'Amount': 1},
+         {'Dish': 'Чай', 'Waiter': 'A', 'Sum': 50, 'Amount': 2}],
+        [{'Dish': 'Борщ', 'Waiter': 'A', 'Sum': 200, 'Amount': 2},
+         {'Dish': 'Борщ', 'Waiter': 'B', 'Sum': 10, 'Amount': 1}],
+    ]
+    assert merge_rows(chunks, ['Dish', 'Waiter'], ['Sum', 'Amount']) == [
+        {'Dish': 'Борщ', 'Waiter': 'A', 'Sum': 300, 'Amount': 3},
+        {'Dish': 'Чай', 'Waiter': 'A', 'Sum': 50, 'Amount': 2},
+        {'Dish': 'Борщ', 'Waiter': 'B', 'Sum': 10, 'Amount': 1},
+    ]
+
+
+def test_merge_rows_empty_values_count_as_zero():
+    chunks = [[{'Dish': 'Борщ', 'Sum': None}], [{'Dish': 'Борщ', 'Sum': 5}], [{'Dish': 'Борщ'}]]
+    assert merge_rows(chunks, ['Dish'], ['Sum']) == [{'Dish': 'Борщ', 'Sum': 5}]
+
+
+def test_merge_rows_modes():
+    chunks = [[{'Dish': 'Борщ', 'Min': 3, 'Max': 3, 'First': 'a', 'Sum': 1}],
+              [{'Dish': 'Борщ', 'Min': None, 'Max': 7, 'First': 'b', 'Sum': 1}],
+              [{'Dish': 'Борщ', 'Min': 1, 'Max': None, 'First': 'c', 'Sum': 1}]]
+    merge = {'Min': 'min', 'Max': 'max', 'First': 'first'}
+    merged = merge_rows(chunks, ['Dish'], ['Min', 'Max', 'First', 'Sum'], merge)
+    assert merged == [{'Dish': 'Борщ', 'Min': 1, 'Max': 7, 'First': 'a', 'Sum': 3}]
+
+
+def test_merge_rows_does_not_modify_input():
+    row = {'Dish': 'Борщ', 'Sum': 1}
+    merge_rows([[row], [{'Dish': 'Борщ', 'Sum': 2}]], ['Dish'], ['Sum'])
+    assert row == {'Dish': 'Борщ', 'Sum': 1}
+
+
+def test_merge_rows_without_groups_gives_one_row():
+    assert merge_rows([[{'Sum': 1}], [{'Sum': 2}]], [], ['Sum']) == [{'Sum': 3}]
+
+
+def test_merge_rows_unknown_mode():
+    with pytest.raises(KeyError):
+        merge_rows([], ['Dish'], ['Sum'], {'Sum': 'avg'})
+
+
+def test_split_period_month():
+    assert split_period(D(2020, 1, 15), D(2020, 3, 10), 'month') == [
+        (D(2020, 1, 15), D(2020, 2, 1)), (D(2020, 2, 1), D(2020, 3, 1)), (D(2020, 3, 1), D(2020, 3, 10))]
+
+
+def test_split_period_week_starts_on_monday():
+    assert split_period(D(2021, 1, 1), D(2021, 1, 12), 'week') == [
+        (D(2021, 1, 1), D(2021, 1, 4)), (D(2021, 1, 4), D(2021, 1, 11)), (D(2021, 1, 11), D(2021, 1, 12))]
+
+
+def test_split_period_empty_and_unknown_window():
+    assert split_period(D(2020, 1, 1), D(2020, 1, 1), 'day') == []
+    with pytest.raises(ValueError):
+        split_period(D(2020, 1, 1), D(2020, 1, 2), 'year')
+
+
+def test_shard_request_converts_closed_period():
+    request = {'filters': {'OpenDate.Typed': {'filterType': 'DateRange', 'periodType': 'CUSTOM',
+                                              'from': '2020-01-30T00:00:00', 'to': '2020-02-02',
+                                              'includeLow': True, 'includeHigh': True}}}
+    assert request_period(request) == ('OpenDate.Typed', D(2020, 1, 30), D(2020, 2, 3))
+    shards = shard_request(request, 'month')
+    assert [(start, end) for start, end, _ in shards] == [
+        (D(2020, 1, 30), D(2020, 2, 1)), (D(2020, 2, 1), D(2020, 2, 3))]
+    period = shards[1][2]['filters']['OpenDate.Typed']
+    assert (period['from'], period['to'], period['includeLow'], period['includeHigh']) == \
+        ('2020-02-01', '2020-02-03', True, False)
+    assert request['filters']['OpenDate.Typed']['to'] == '2020-02-02'
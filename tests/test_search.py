@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from Pyiiko2.search import SearchIndex, trigrams, _required_literals
+
+PRODUCTS = [
+    {'id': '1', 'num': '00001', 'code': '101', 'name': 'Борщ украинский'},
+    {'id': '2', 'num': '00002', 'code': '102', 'name': 'Борщ холодный'},
+    {'id': '3', 'num': '00003', 'code': '103', 'name': 'Солянка'},
+    {'id': '4', 'num': '00004', 'code': '104', 'name': 'Борщ старый', 'deleted': True},
+    {'id': '5', 'num': '00001', 'code': '105', 'name': 'Пельмени'},
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.update(PRODUCTS)
+    return index
+
+
+def ids(records):
+    return [record['id'] for record in records]
+
+
+def test_trigrams():
+    assert trigrams('AbCd') == {'abc', 'bcd'}
+    assert trigrams('ab') == set()
+
+
+def test_required_literals():
+    assert _required_literals('Борщ.*холод') == ['Борщ', 'холод']
+    assert _required_literals('a|b') == []
+    assert _required_literals('(') == []
+
+
+def test_get_contains_len(index):
+    assert len(index) == 5
+    assert '3' in index
+    assert index.get('3')['name'] == 'Солянка'
+    assert index.get('missing') is None
+
+
+def test_lookup_exact_value(index):
+    assert ids(index.lookup('num', '00001')) == ['1', '5']
+    assert ids(index.lookup('code', '103')) == ['3']
+    assert index.lookup('code', '999') == []
+
+
+def test_find_regex_is_case_sensitive_by_default(index):
+    assert ids(index.find(name='Борщ')) == ['1', '2']
+    assert index.find(name='борщ') == []
+    assert ids(index.find(name='^Бор.*ый$')) == ['2']
+
+
+def test_find_regex_case_insensitive(index):
+    assert ids(index.find(name='борщ', case_sensitive=False)) == ['1', '2']
+
+
+def test_find_substring(index):
+    assert ids(index.find(name='лянк', mode='substring')) == ['3']
+    assert ids(index.find(name='ХОЛОД', mode='substring', case_sensitive=False)) == ['2']
+    # в режиме подстроки символы шаблона не являются регулярным выражением
+    assert index.find(name='Бор.', mode='substring') == []
+
+
+def test_find_exact(index):
+    assert ids(index.find(name='Солянка', mode='exact')) == ['3']
+    assert index.find(name='Солян', mode='exact') == []
+    assert ids(index.find(name='солянка', mode='exact', case_sensitive=False)) == ['3']
+
+
+def test_find_short_pattern_scans_all_records(index):
+    assert ids(index.find(code='10')) == ['1', '2', '3', '5']
+
+
+def test_find_several_fields(index):
+    assert ids(index.find(name='Борщ', code='102')) == ['2']
+
+
+def test_find_deleted(index):
+    assert ids(index.find(name='Борщ', include_deleted=True)) == ['1', '2', '4']
+
+
+def test_find_unknown_mode(index):
+    with pytest.raises(ValueError):
+        index.find(name='Борщ', mode='glob')
+
+
+def test_update_counts_only_changes(index):
+    records = [dict(record) for record in PRODUCTS if record['id'] != '3']
+    records[0]['name'] = 'Борщ с пампушками'
+    records.append({'id': '6', 'num': '00006', 'code': '106', 'name': 'Окрошка'})
+    assert index.update(records) == {'added': 1, 'changed': 1, 'deleted': 1}
+    assert index.update(records) == {'added': 0, 'changed': 0, 'deleted': 0}
+
+
+def test_update_reindexes_changed_record(index):
+    records = [dict(record) for record in PRODUCTS]
+    records[2] = dict(records[2], name='Рассольник', code='203')
+    index.update(records)
+    assert index.find(name='Солянка') == []
+    assert index.lookup('code', '103') == []
+    assert ids(index.find(name='Рассольник')) == ['3']
+    assert ids(index.lookup('code', '203')) == ['3']
+
+
+def test_update_partial_keeps_missing_records(index):
+    assert index.update([{'id': '7', 'name': 'Морс'}], complete=False) == {'added': 1, 'changed': 0, 'deleted': 0}
+    assert len(index) == 6
+
+
+def test_deleted_record_leaves_no_postings(index):
+    index.update([record for record in PRODUCTS if record['id'] != '3'])
+    assert '3' not in index
+    assert index.find(name='Солянка') == []
+    assert index.find(name='лянк', mode='substring') == []
+
+
+def test_changed_record_moves_to_end_of_order(index):
+    records = [dict(record) for record in PRODUCTS]
+    records[0]['name'] = 'Борщ украинский с салом'
+    index.update(records)
+    assert ids(index.find(name='Борщ')) == ['2', '1']
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from Pyiiko2.session import LineSplitter, iter_lines
+
+
+def split(data, sizes, delimiter=None):
+    """Подает data в LineSplitter кусками заданных размеров"""
+    splitter = LineSplitter(delimiter)
+    lines, position = [], 0
+    for size in sizes:
+        lines += splitter.feed(data[position:position + size])
+        position += size
+    lines += splitter.feed(data[position:])
+    return lines + splitter.close()
+
+
+class FakeResponse(object):
+    def __init__(self, chunks, encoding='utf-8'):
+        self.chunks = chunks
+        self.encoding = encoding
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def test_default_delimiter_strips_carriage_return():
+    assert split(b'a\r\nb\nc', [100]) == [b'a', b'b', b'c']
+
+
+def test_crlf_split_across_chunks_gives_no_empty_lines():
+    assert split(b'a\r\nb\r\n', [2]) == [b'a', b'b']
+
+
+def test_multibyte_delimiter_split_across_chunks():
+    splitter = LineSplitter(b'\r\n')
+    assert splitter.feed(b'a\r') == []
+    assert splitter.feed(b'\nb') == [b'a']
+    assert splitter.close() == [b'b']
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 4, 5, 7])
+def test_three_byte_delimiter_any_chunking(size):
+    data = b'<|>'.join(b'line%d' % i for i in range(50)) + b'<|>'
+    assert split(data, [size] * (len(data) // size), b'<|>') == [b'line%d' % i for i in range(50)]
+
+
+def test_str_delimiter_is_encoded():
+    assert split(b'a;b;', [1, 1, 1], ';') == [b'a', b'b']
+
+
+def test_custom_delimiter_keeps_carriage_return():
+    assert split(b'a\r|b', [100], b'|') == [b'a\r', b'b']
+
+
+def test_long_line_accumulates_chunks():
+    data = b'x' * 1000 + b'\n' + b'y'
+    assert split(data, [10] * 100) == [b'x' * 1000, b'y']
+
+
+def test_close_without_trailing_data():
+    splitter = LineSplitter()
+    assert splitter.feed(b'a\n') == [b'a']
+    assert splitter.close() == []
+
+
+def test_iter_lines_decodes_and_closes():
+    response = FakeResponse([b'\xd0\xb1\xd0', b'\xbe\xd1\x80\xd1\x89\r', b'\n2\n'])
+    assert list(iter_lines(response, decode_unicode=True)) == ['борщ', '2']
+    assert response.closed
+
+
+def test_iter_lines_delimiter_split_across_chunks():
+    response = FakeResponse([b'a<', b'|', b'>b<|', b'>'])
+    assert list(iter_lines(response, delimiter=b'<|>')) == [b'a', b'b']
+
+
+def test_iter_lines_closes_on_early_exit():
+    response = FakeResponse([b'a\nb\nc\n'])
+    lines = iter_lines(response)
+    assert next(lines) == b'a'
+    lines.close()
+    assert response.closed
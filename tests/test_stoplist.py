@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from Pyiiko2.stoplist import ADDED, CHANGED, REMOVED, StopChange, StopListWatcher, diff, snapshot
+
+RESULT = {'stopList': [
+    {'deliveryTerminalId': 't1', 'items': [{'productId': 'p1', 'balance': 0}, {'productId': 'p2', 'balance': 3}]},
+    {'deliveryTerminalId': 't2', 'items': [{'productId': 'p1', 'balance': 1}]},
+    {'deliveryTerminalId': 't3', 'items': None},
+]}
+
+
+class FakeResponse(object):
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return self.data
+
+
+def test_snapshot_keys_by_terminal_and_product():
+    assert snapshot(RESULT) == {('t1', 'p1'): 0, ('t1', 'p2'): 3, ('t2', 'p1'): 1}
+
+
+def test_snapshot_accepts_list_and_empty_result():
+    assert snapshot(RESULT['stopList']) == snapshot(RESULT)
+    assert snapshot({}) == {}
+    assert snapshot({'stopList': None}) == {}
+
+
+def test_snapshot_without_terminal():
+    assert snapshot([{'items': [{'productId': 'p1', 'balance': 2}]}]) == {(None, 'p1'): 2}
+
+
+def test_diff_of_equal_snapshots_is_empty():
+    assert diff('org', snapshot(RESULT), snapshot(RESULT)) == []
+
+
+def test_diff_kinds():
+    previous = {('t1', 'p1'): 0, ('t1', 'p2'): 3, ('t2', 'p1'): 1}
+    current = {('t1', 'p1'): 0, ('t1', 'p2'): 1, ('t2', 'p3'): 5}
+    changes = sorted(diff('org', previous, current))
+    assert changes == [
+        StopChange(ADDED, 'org', 't2', 'p3', 5, None),
+        StopChange(CHANGED, 'org', 't1', 'p2', 1, 3),
+        StopChange(REMOVED, 'org', 't2', 'p1', None, 1),
+    ]
+
+
+def test_diff_from_empty_adds_everything():
+    changes = diff('org', {}, snapshot(RESULT))
+    assert {change.kind for change in changes} == {ADDED}
+    assert len(changes) == 3
+
+
+def test_watcher_reports_only_changes():
+    smaller = {'stopList': [{'deliveryTerminalId': 't1', 'items': [{'productId': 'p1', 'balance': 0}]}]}
+    responses = [FakeResponse(RESULT), FakeResponse(RESULT), FakeResponse(smaller)]
+
+    class Biz(object):
+        def stop_list(self, organization):
+            return responses.pop(0)
+
+    received = []
+    watcher = StopListWatcher(Biz(), ['org'], max_workers=1)
+    watcher.subscribe(received.append)
+    assert len(watcher.poll()) == 3
+    assert watcher.poll() == []
+    changes = watcher.poll()
+    assert sorted((change.kind, change.terminal, change.product_id) for change in changes) == [
+        (REMOVED, 't1', 'p2'), (REMOVED, 't2', 'p1')]
+    assert len(received) == 5
+    assert watcher.snapshot('org') == {('t1', 'p1'): 0}
+
+
+def test_watcher_keeps_snapshot_on_error():
+    responses = [FakeResponse(RESULT), FakeResponse(None, status_code=500), FakeResponse(RESULT)]
+
+    class Biz(object):
+        def stop_list(self, organization):
+            return responses.pop(0)
+
+    watcher = StopListWatcher(Biz(), ['org'], max_workers=1)
+    watcher.poll()
+    assert watcher.poll() == []
+    assert 'org' in watcher.errors
+    assert watcher.poll() == []
+    assert watcher.errors == {}